@@ -0,0 +1 @@
+# Shared helpers used by both the web service and the datasync jobs.
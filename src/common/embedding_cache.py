@@ -0,0 +1,167 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# 超出容量后一次多淘汰一些，避免每次写入都触发淘汰
+EVICT_SLACK = 0.05
+# 命中时只在内存中记录最后使用时间，累计到一定数量或间隔后批量写回
+TOUCH_FLUSH_SIZE = 1000
+TOUCH_FLUSH_INTERVAL = 30.0
+
+
+def normalize_text(text: str) -> str:
+    """NFKC 归一化 (全角转半角等) 并合并空白，作为缓存键和实际编码的文本"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class EmbeddingStore:
+    """
+    按内容寻址的 embedding 持久化存储: (模型, 类型, 归一化文本) -> float32 向量
+
+    底层是 SQLite (WAL)，Web 服务和索引构建脚本可以同时使用同一个文件；
+    记录最后使用时间，条目数超过 max_entries 时按 LRU 淘汰。
+    命中只更新内存中的最后使用时间，在写入、淘汰、关闭前或累计足够多时批量写回，读路径上没有写事务。
+    """
+
+    def __init__(self, path, max_entries: int):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        self._flushed_at = time.monotonic()
+        self._connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            # WAL 模式下 NORMAL 只在检查点时 fsync，掉电最多丢失最近的缓存写入
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key       TEXT PRIMARY KEY,
+                    vector    BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._count = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(namespace: str, text: str) -> str:
+        return hashlib.sha1(f"{namespace}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        found = {}
+        now = time.time()
+        with self._lock:
+            # SQLite 单条语句的参数个数有限，分段查询
+            for i in range(0, len(keys), 500):
+                chunk = keys[i: i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(rows)
+            self._touched.update((key, now) for key in found)
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            if len(self._touched) >= TOUCH_FLUSH_SIZE or time.monotonic() - self._flushed_at > TOUCH_FLUSH_INTERVAL:
+                self._flush_touched()
+        return [
+            np.frombuffer(found[key], dtype=np.float32).tolist() if key in found else None
+            for key in keys
+        ]
+
+    def set_many(self, items):
+        """items: [(key, vector)]"""
+        now = time.time()
+        with self._lock:
+            # 先写回最后使用时间，淘汰时才不会误删刚命中的条目
+            self._flush_touched()
+            with self._connection:
+                before = self._connection.total_changes
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items],
+                )
+                self._count += self._connection.total_changes - before
+                if self._count > self.max_entries * (1 + EVICT_SLACK):
+                    self._connection.execute(
+                        """
+                        DELETE FROM embeddings WHERE key IN (
+                            SELECT key FROM embeddings ORDER BY last_used LIMIT ?
+                        )
+                        """,
+                        (self._count - self.max_entries,),
+                    )
+                    self._count = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _flush_touched(self):
+        """把内存中记录的最后使用时间写回 SQLite，调用方持有 _lock"""
+        self._flushed_at = time.monotonic()
+        if not self._touched:
+            return
+        touched, self._touched = self._touched, {}
+        with self._connection:
+            self._connection.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key, now in touched.items()]
+            )
+
+    def stats(self):
+        with self._lock:
+            return {"size": self._count, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._connection.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    为任意 LangChain Embeddings 加上持久化缓存
+
+    文本先归一化再查缓存，只把未命中的文本交给底层模型批量编码。
+    文档与查询分开缓存 (部分模型对查询会加指令前缀)；
+    同一模型下索引构建写入的实体名称向量，服务端对齐时可以直接复用。
+    """
+
+    def __init__(self, embeddings: Embeddings, store: EmbeddingStore, model_name: str):
+        self.embeddings = embeddings
+        self.store = store
+        self.model_name = model_name
+
+    def _embed(self, kind: str, texts: List[str], compute) -> List[List[float]]:
+        normalized = [normalize_text(text) for text in texts]
+        namespace = f"{self.model_name}:{kind}"
+        keys = [EmbeddingStore.make_key(namespace, text) for text in normalized]
+        vectors = self.store.get_many(keys)
+
+        # 同一批中重复的文本只编码一次
+        missing = {}
+        for key, text, vector in zip(keys, normalized, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        if missing:
+            computed = compute(list(missing.values()))
+            by_key = dict(zip(missing, computed))
+            self.store.set_many(by_key.items())
+            vectors = [vector if vector is not None else by_key[key] for key, vector in zip(keys, vectors)]
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed("document", texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed("query", [text], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
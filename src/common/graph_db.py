@@ -0,0 +1,59 @@
+import threading
+from typing import Any, Dict, Optional
+
+from neo4j import AsyncDriver, AsyncGraphDatabase, Driver, GraphDatabase
+
+# NEO4J_CONFIG 中可选的连接池参数 -> neo4j driver 参数，时间单位为秒
+POOL_SETTINGS = (
+    "max_connection_pool_size",
+    "connection_acquisition_timeout",
+    "liveness_check_timeout",
+    "max_connection_lifetime",
+    "connection_timeout",
+)
+
+
+class Neo4jConnections:
+    """
+    进程内共享的 Neo4j driver
+
+    每个进程只创建一个同步 driver 和一个异步 driver (按需创建)，
+    所有使用方 (ChatService、Neo4jWriter、索引构建) 由入口注入同一个实例，共用同一个连接池。
+    连接池大小、获取连接的超时、空闲连接的存活检查等都在 NEO4J_CONFIG 中统一配置。
+    """
+
+    def __init__(self, neo4j_config: Dict[str, Any]):
+        self.url = neo4j_config["url"]
+        self.auth = (neo4j_config["user"], neo4j_config["password"])
+        self.database: Optional[str] = neo4j_config.get("database")
+        self.settings = {key: neo4j_config[key] for key in POOL_SETTINGS if key in neo4j_config}
+        self._driver: Optional[Driver] = None
+        self._async_driver: Optional[AsyncDriver] = None
+        self._lock = threading.Lock()
+
+    @property
+    def driver(self) -> Driver:
+        if self._driver is None:
+            with self._lock:
+                if self._driver is None:
+                    self._driver = GraphDatabase.driver(self.url, auth=self.auth, **self.settings)
+        return self._driver
+
+    @property
+    def async_driver(self) -> AsyncDriver:
+        if self._async_driver is None:
+            with self._lock:
+                if self._async_driver is None:
+                    self._async_driver = AsyncGraphDatabase.driver(self.url, auth=self.auth, **self.settings)
+        return self._async_driver
+
+    def close(self):
+        if self._driver is not None:
+            self._driver.close()
+            self._driver = None
+
+    async def aclose(self):
+        if self._async_driver is not None:
+            await self._async_driver.close()
+            self._async_driver = None
+        self.close()
@@ -0,0 +1,125 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+# 文件中保留的最近变更记录条数，监听方落后太多时退化为“全部失效”
+HISTORY_SIZE = 50
+
+
+class GraphChangeSignal:
+    """
+    基于本地文件的图数据变更信号
+
+    datasync 同步、索引重建等离线任务写完 Neo4j 后调用 notify()，
+    Web 服务通过 GraphChangeWatcher 轮询同一个文件感知变更，
+    据此刷新 schema 缓存、清理实体对齐/查询结果缓存。
+
+    文件内容:
+    {
+        "version": 3,
+        "history": [
+            {"version": 3, "labels": ["SPU"], "source": "datasync", "timestamp": 1700000000.0}
+        ]
+    }
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._mtime = None
+        self._state = {"version": 0, "history": []}
+
+    def read(self) -> Dict:
+        """读取当前状态，文件未变化时直接返回上次解析的结果"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self._state
+        # 写入方每次原子替换都会产生新的 inode，同一时间戳内的两次写入也能区分
+        mtime = (stat.st_mtime_ns, stat.st_ino)
+        if mtime != self._mtime:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self._state = json.load(f)
+                self._mtime = mtime
+            except (OSError, ValueError) as e:
+                # 写入方使用原子替换，这里一般只会在文件被手工改坏时出现
+                print(f"读取图变更信号失败: {e}")
+        return self._state
+
+    @property
+    def version(self) -> int:
+        return self.read()["version"]
+
+    def notify(self, labels: Iterable[str], source: str) -> int:
+        """记录一次变更并返回新的版本号"""
+        state = self.read()
+        version = state["version"] + 1
+        history = state["history"][-(HISTORY_SIZE - 1):] + [{
+            "version": version,
+            "labels": sorted(set(labels)),
+            "source": source,
+            "timestamp": time.time(),
+        }]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "history": history}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        return version
+
+    def changes_since(self, version: int, sources: Optional[Iterable[str]] = None) -> Optional[Set[str]]:
+        """
+        返回 version 之后发生变更的标签集合
+
+        Args:
+            sources: 只统计这些来源 (如 "index") 的变更，None 表示所有来源
+
+        Returns:
+            set: 变更的标签 (无变更时为空集合)
+            None: 历史记录已不完整，无法确定具体标签，调用方应全部失效
+        """
+        state = self.read()
+        if state["version"] <= version:
+            return set()
+        history = [entry for entry in state["history"] if entry["version"] > version]
+        if not history or history[0]["version"] != version + 1:
+            return None
+        labels = set()
+        for entry in history:
+            if sources is None or entry.get("source") in sources:
+                labels.update(entry["labels"])
+        return labels
+
+
+class GraphChangeWatcher:
+    """轮询 GraphChangeSignal，把变更的标签分发给订阅者"""
+
+    def __init__(self, signal: GraphChangeSignal):
+        self.signal = signal
+        self.version = signal.version
+        self._subscribers: List[Tuple[Callable[[Optional[Set[str]]], None], Optional[FrozenSet[str]]]] = []
+
+    def subscribe(self, callback: Callable[[Optional[Set[str]]], None], sources: Optional[Iterable[str]] = None):
+        """
+        callback 接收变更的标签集合，None 表示全部失效
+
+        指定 sources 时只接收这些来源的变更，期间没有这些来源的变更则不回调。
+        """
+        self._subscribers.append((callback, frozenset(sources) if sources is not None else None))
+
+    def poll(self) -> bool:
+        """检查是否有新的变更，有则通知订阅者；开销是一次 stat 调用"""
+        current = self.signal.version
+        if current == self.version:
+            return False
+        # 信号文件被重置时版本号会回退，无法判断变更范围
+        reset = current < self.version
+        previous, self.version = self.version, current
+        for callback, sources in self._subscribers:
+            labels = None if reset else self.signal.changes_since(previous, sources)
+            if labels is not None and not labels and sources is not None:
+                continue
+            callback(labels)
+        return True
@@ -30,12 +30,125 @@ SAVE_STEPS = 20
 
 LABELS = ['B', 'I', 'O']
 
+# 数据预处理 (ner/preprocess.py)：划分数据集的随机种子、并行进程数、每批条数
+SEED = 42
+PREPROCESS_WORKERS = 4
+PREPROCESS_BATCH_SIZE = 1000
+
+# 训练/评估的分批方式 (ner/batching.py): random | length | tokens，tokens 模式下每批 padding 后的最大 token 数
+BATCHING = "random"
+MAX_TOKENS_PER_BATCH = 2048
+
 NEO4J_CONFIG = {
     "url": "neo4j://localhost:7688",
     "user": "neo4j",
-    "password": "password"
+    "password": "password",
+    # 连接池 (common/graph_db.Neo4jConnections，每个进程共享一个)，时间单位为秒
+    "max_connection_pool_size": 50,
+    "connection_acquisition_timeout": 30,
+    # 空闲超过该时间的连接在使用前先做存活检查
+    "liveness_check_timeout": 30,
+    "max_connection_lifetime": 3600,
+}
+
+# ChatService 线程池大小：embedding 推理等阻塞调用的最大并发数
+CHAT_EXECUTOR_WORKERS = 4
+
+# Schema 缓存刷新间隔 (秒)
+SCHEMA_CACHE_TTL = 600
+
+# 实体对齐：节点标签 → (向量索引, 全文索引)，索引由 src/web/utils.py 创建
+ALIGNMENT_INDEXES = {
+    "SPU": ("spu_embedding_index", "spu_full_text_index"),
+    "BaseTrademark": ("trademark_embedding_index", "trademark_full_text_index"),
+    "Category3": ("category3_embedding_index", "category3_full_text_index"),
+    "Category2": ("category2_embedding_index", "category2_full_text_index"),
+    "Category1": ("category1_embedding_index", "category1_full_text_index"),
 }
 
+# 实体对齐引擎："neo4j" 走 Neo4j 向量+全文索引，"local" 使用进程内的快照 (src/web/local_index.py)
+# 快照由 src/web/utils.py 在重建索引后导出，缺失时自动回退到 neo4j
+ALIGNMENT_ENGINES = {
+    "SPU": "neo4j",
+    "BaseTrademark": "local",
+    "Category3": "local",
+    "Category2": "local",
+    "Category1": "local",
+}
+ALIGNMENT_SNAPSHOT_DIR = ROOT_DIR / 'run' / 'alignment'
+
+# 实体对齐缓存：每个标签的最大条目数、过期时间 (秒)
+ALIGNMENT_CACHE_SIZE = 10000
+ALIGNMENT_CACHE_TTL = 24 * 3600
+
+# 问题 → Cypher 语义缓存：余弦相似度阈值、最大条目数、过期时间 (秒)
+CYPHER_CACHE_THRESHOLD = 0.92
+# 没有实体的缓存条目无法校验实体，只在问题几乎相同时复用
+CYPHER_CACHE_EXACT_THRESHOLD = 0.98
+CYPHER_CACHE_SIZE = 1000
+CYPHER_CACHE_TTL = 3600
+
+# 查询结果缓存：内存预算 (字节)、过期时间 (秒)
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RESULT_CACHE_TTL = 600
+
+# 最终答案缓存：最大条目数、过期时间 (秒)
+ANSWER_CACHE_SIZE = 2000
+ANSWER_CACHE_TTL = 3600
+
+# 请求追踪：环形缓冲区保留的最近 Trace 数量
+TRACE_BUFFER_SIZE = 200
+
+# 实体名称 / 问题的 embedding 模型 (索引构建与 ChatService 必须一致)
+EMBEDDING_MODEL_NAME = "BAAI/bge-small-zh-v1.5"
+
+# 持久化 embedding 缓存：索引构建与 ChatService 共享，超出条目数后按 LRU 淘汰
+EMBEDDING_CACHE_FILE = ROOT_DIR / 'run' / 'embedding_cache.sqlite'
+EMBEDDING_CACHE_MAX_ENTRIES = 1_000_000
+
+# 索引构建生成 embedding：每批编码的条数、编码线程数、读取节点时驱动每次拉取的条数
+EMBEDDING_BATCH_SIZE = 256
+EMBEDDING_THREADS = 2
+EMBEDDING_FETCH_SIZE = 2000
+
+# Web 服务内的 NER 推理：模型目录 (train.py 的输出)、微批的最大条数与最长等待时间、最大 token 数
+NER_MODEL_DIR = CHECKPOINT_DIR / 'ner' / 'best_model'
+NER_MAX_BATCH_SIZE = 32
+NER_MAX_LATENCY_MS = 5
+NER_MAX_LENGTH = 128
+# NER 预对齐：识别出的片段只对这些标签预先对齐 (品牌、分类名较短，SPU 全称一般不会是单个片段)，
+# LLM 返回后最多再等待的时间 (毫秒)，超时则取消，实体对齐照常进行
+NER_PREALIGN_LABELS = ["BaseTrademark", "Category3", "Category2", "Category1"]
+NER_PREALIGN_TIMEOUT_MS = 100
+# 推理后端: "torch" 或 "onnx" (ner/export_onnx.py 导出)，NER_ONNX_QUANTIZED 为 True 时使用 int8 量化模型
+NER_BACKEND = "torch"
+NER_ONNX_DIR = CHECKPOINT_DIR / 'ner' / 'onnx'
+NER_ONNX_MODEL_FILE = 'model.onnx'
+NER_ONNX_QUANTIZED_FILE = 'model.int8.onnx'
+NER_ONNX_QUANTIZED = True
+
+# 图数据变更信号文件：datasync / 索引重建写入，Web 服务轮询
+GRAPH_CHANGE_FILE = ROOT_DIR / 'run' / 'graph_changes.json'
+
+# datasync 读取 MySQL：服务端游标每次读取的行数
+MYSQL_FETCH_SIZE = 5000
+
+# datasync 写入 Neo4j：每个写事务的行数 (并行度由 DATASYNC_WORKERS 控制)
+NEO4J_BATCH_SIZE = 5000
+
+# datasync 指标文件 (Prometheus 文本格式)，供 node_exporter textfile collector 采集
+DATASYNC_METRICS_FILE = ROOT_DIR / 'run' / 'metrics' / 'datasync.prom'
+
+# MySQL 表 -> Neo4j 图的映射文件
+DATASYNC_MAPPING_FILE = ROOT_DIR / 'src' / 'conf' / 'graph_mapping.yaml'
+
+# 增量同步状态 (每个同步任务上次写入的行键和内容摘要)
+DATASYNC_STATE_FILE = ROOT_DIR / 'run' / 'datasync_state.sqlite'
+
+# datasync 并行执行的同步任务数，以及失败后用于 --resume 的进度文件
+DATASYNC_WORKERS = 4
+DATASYNC_PROGRESS_FILE = ROOT_DIR / 'run' / 'datasync_progress.json'
+
 MYSQL_CONFIG = {
     "host": "localhost",
     "port": 3306,
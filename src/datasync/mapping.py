@@ -0,0 +1,145 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+
+
+@dataclass
+class Route:
+    """按 column 的值选择端点标签"""
+    column: str
+    labels: Dict[str, str]
+
+    def label_for(self, value) -> Optional[str]:
+        return self.labels.get(str(value))
+
+
+@dataclass
+class Endpoint:
+    label: Optional[str] = None
+    column: Optional[str] = None
+    route: Optional[Route] = None
+
+    @property
+    def labels(self) -> Tuple[str, ...]:
+        if self.route is not None:
+            return tuple(dict.fromkeys(self.route.labels.values()))
+        return (self.label,)
+
+
+@dataclass
+class NodeMapping:
+    job: str
+    label: str
+    table: str
+    columns: Dict[str, str]
+    where: Optional[str] = None
+
+    def sql(self) -> str:
+        select = ",\n       ".join(f"{column} AS {prop}" for prop, column in self.columns.items())
+        return _with_where(f"SELECT {select}\nFROM {self.table}", self.where)
+
+
+@dataclass
+class RelationshipMapping:
+    job: str
+    type: str
+    start: Endpoint
+    end: Endpoint
+    table: Optional[str] = None
+    sql_text: Optional[str] = None
+    where: Optional[str] = None
+
+    @property
+    def routed(self) -> bool:
+        return self.start.route is not None or self.end.route is not None
+
+    def sql(self) -> str:
+        if self.sql_text:
+            return self.sql_text
+        select = [f"{self.start.column} AS start_id", f"{self.end.column} AS end_id"]
+        if self.start.route is not None:
+            select.append(f"{self.start.route.column} AS start_route")
+        if self.end.route is not None:
+            select.append(f"{self.end.route.column} AS end_route")
+        return _with_where(f"SELECT {', '.join(select)}\nFROM {self.table}", self.where)
+
+    def targets(self) -> List[Tuple[str, str]]:
+        """所有 (起点标签, 终点标签) 组合，每个组合对应一个关系写入目标"""
+        return [(start, end) for start in self.start.labels for end in self.end.labels]
+
+    def route(self, row) -> Optional[Tuple[str, str]]:
+        """返回该行对应的 (起点标签, 终点标签)，路由列的值没有对应标签时返回 None"""
+        start = self.start.route.label_for(row["start_route"]) if self.start.route else self.start.label
+        end = self.end.route.label_for(row["end_route"]) if self.end.route else self.end.label
+        if start is None or end is None:
+            return None
+        return start, end
+
+
+@dataclass
+class GraphMapping:
+    nodes: List[NodeMapping] = field(default_factory=list)
+    relationships: List[RelationshipMapping] = field(default_factory=list)
+
+
+def _with_where(sql, where):
+    return f"{sql}\nWHERE {where}" if where else sql
+
+
+def _endpoint(spec) -> Endpoint:
+    route = spec.get("route")
+    if route is not None:
+        route = Route(column=route["column"], labels={str(k): v for k, v in route["labels"].items()})
+    return Endpoint(label=spec.get("label"), column=spec.get("column"), route=route)
+
+
+def parse_mapping(spec: dict) -> GraphMapping:
+    """把映射 (dict，通常来自 YAML) 解析为 GraphMapping，并检查必填项"""
+    mapping = GraphMapping()
+    jobs = set()
+
+    def claim(job):
+        if job in jobs:
+            raise ValueError(f"重复的同步任务名: {job}")
+        jobs.add(job)
+
+    for item in spec.get("nodes") or []:
+        claim(item["job"])
+        if "id" not in item["columns"]:
+            raise ValueError(f"节点任务 {item['job']} 的 columns 必须包含 id")
+        mapping.nodes.append(NodeMapping(
+            job=item["job"],
+            label=item["label"],
+            table=item["table"],
+            columns=dict(item["columns"]),
+            where=item.get("where"),
+        ))
+
+    for item in spec.get("relationships") or []:
+        claim(item["job"])
+        relationship = RelationshipMapping(
+            job=item["job"],
+            type=item["type"],
+            start=_endpoint(item["start"]),
+            end=_endpoint(item["end"]),
+            table=item.get("table"),
+            sql_text=item.get("sql"),
+            where=item.get("where"),
+        )
+        if relationship.sql_text is None and relationship.table is None:
+            raise ValueError(f"关系任务 {relationship.job} 需要 table 或 sql")
+        if relationship.sql_text is not None and relationship.routed:
+            raise ValueError(f"关系任务 {relationship.job}: sql 与 route 不能同时使用")
+        for endpoint in (relationship.start, relationship.end):
+            if endpoint.route is None and endpoint.label is None:
+                raise ValueError(f"关系任务 {relationship.job} 的端点缺少 label")
+            if relationship.sql_text is None and endpoint.column is None:
+                raise ValueError(f"关系任务 {relationship.job} 的端点缺少 column")
+        mapping.relationships.append(relationship)
+    return mapping
+
+
+def load_mapping(path) -> GraphMapping:
+    with open(path, encoding="utf-8") as f:
+        return parse_mapping(yaml.safe_load(f))
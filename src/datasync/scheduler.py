@@ -0,0 +1,138 @@
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Sequence, Tuple
+
+
+@dataclass
+class SyncJob:
+    """
+    一个同步任务
+
+    produces: 任务写入的节点标签，depends: 任务开始前必须写完的标签。
+    关系任务依赖两端的节点标签，节点任务之间互不依赖，可以并行。
+    """
+    name: str
+    run: Callable[[], None]
+    produces: Tuple[str, ...] = ()
+    depends: Tuple[str, ...] = ()
+
+
+@dataclass
+class SyncReport:
+    timings: Dict[str, float] = field(default_factory=dict)
+    failed: Dict[str, str] = field(default_factory=dict)
+    skipped: List[str] = field(default_factory=list)
+    resumed: List[str] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return not self.failed and not self.skipped
+
+
+class SyncScheduler:
+    """
+    按依赖关系并行执行同步任务
+
+    任务的依赖满足后立即提交到线程池，总耗时接近最长的依赖链。
+    任务失败时，依赖它的任务被跳过，其余任务照常执行；
+    已完成的任务记录在进度文件中，resume=True 时跳过这些任务，全部成功后删除进度文件。
+    """
+
+    def __init__(self, jobs: Sequence[SyncJob], workers: int, progress_file=None):
+        self.jobs = {job.name: job for job in jobs}
+        self.workers = workers
+        self.progress_file = progress_file
+        self._check(jobs)
+
+    @staticmethod
+    def _check(jobs):
+        producers = {}
+        for job in jobs:
+            for label in job.produces:
+                if label in producers:
+                    raise ValueError(f"标签 {label} 同时由 {producers[label]} 和 {job.name} 写入")
+                producers[label] = job.name
+        for job in jobs:
+            missing = [label for label in job.depends if label not in producers]
+            if missing:
+                raise ValueError(f"任务 {job.name} 依赖的标签没有对应的同步任务: {missing}")
+
+    def _load_progress(self) -> List[str]:
+        if not self.progress_file or not os.path.exists(self.progress_file):
+            return []
+        with open(self.progress_file, encoding="utf-8") as f:
+            return json.load(f).get("completed", [])
+
+    def _save_progress(self, completed):
+        if not self.progress_file:
+            return
+        path = str(self.progress_file)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"completed": sorted(completed)}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _clear_progress(self):
+        if self.progress_file and os.path.exists(self.progress_file):
+            os.remove(self.progress_file)
+
+    def run(self, resume=False) -> SyncReport:
+        report = SyncReport()
+        completed = set(name for name in self._load_progress() if name in self.jobs) if resume else set()
+        report.resumed = sorted(completed)
+        if not resume:
+            self._clear_progress()
+
+        produced = {label for name in completed for label in self.jobs[name].produces}
+        blocked = set()  # 失败任务的产出
+        pending = [name for name in self.jobs if name not in completed]
+        running: Dict[object, Tuple[str, float]] = {}
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="datasync") as executor:
+            while pending or running:
+                for name in list(pending):
+                    job = self.jobs[name]
+                    if any(label in blocked for label in job.depends):
+                        pending.remove(name)
+                        blocked.update(job.produces)
+                        report.skipped.append(name)
+                        print(f"[skip] {name}: 依赖的任务失败")
+                    elif all(label in produced for label in job.depends):
+                        pending.remove(name)
+                        running[executor.submit(job.run)] = (name, time.perf_counter())
+                if not running:
+                    break
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, job_start = running.pop(future)
+                    job = self.jobs[name]
+                    report.timings[name] = time.perf_counter() - job_start
+                    error = future.exception()
+                    if error is None:
+                        completed.add(name)
+                        produced.update(job.produces)
+                        self._save_progress(completed)
+                    else:
+                        blocked.update(job.produces)
+                        report.failed[name] = repr(error)
+                        print(f"[fail] {name}: {error!r}")
+
+        report.elapsed = time.perf_counter() - start
+        if report.ok:
+            self._clear_progress()
+        return report
+
+
+def print_report(report: SyncReport):
+    for name, elapsed in sorted(report.timings.items(), key=lambda item: -item[1]):
+        status = "失败" if name in report.failed else "完成"
+        print(f"{name:<32} {elapsed:>8.2f}s {status}")
+    if report.resumed:
+        print(f"跳过上次已完成的任务 {len(report.resumed)} 个")
+    print(f"总耗时 {report.elapsed:.2f}s，任务耗时合计 {sum(report.timings.values()):.2f}s")
@@ -0,0 +1,208 @@
+import hashlib
+import itertools
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+# 每批比较的行数 (同时也是一次从 SQLite 取出的最大变更行数)
+FETCH_SIZE = 5000
+
+
+def _key(row, key_fields):
+    return json.dumps([row[field] for field in key_fields], default=str)
+
+
+def _digest(row):
+    payload = json.dumps(row, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class SyncState:
+    """
+    增量同步状态：记录每个同步任务上次写入 Neo4j 的每一行的键和内容摘要
+
+    一次增量同步的流程 (见 TableSynchronizer):
+        1. begin(job, key_fields)   开始比较
+        2. diff(rows)               源数据逐批写入临时表，每批立即产出摘要与上次不同 (新增或修改) 的行，
+                                    交给 Neo4jWriter 写入；读 MySQL 与写 Neo4j 仍然重叠进行
+        3. deleted_keys()           上次存在、本次源数据中已消失的键，从 Neo4j 删除
+        4. commit()                 写入成功后才更新状态，失败时下次会重新写入 (MERGE 幂等)
+
+    关系的写入依赖两端节点已存在，diff(rows, confirm=True) 的行只有经 confirm() 确认
+    真正写入后才记入状态，端点缺失的关系下次同步会重试。
+    节点被删除 (DETACH DELETE 连带删除了关系) 时由 forget_endpoints() 清除相关的关系状态。
+
+    以任务“产出的行”而不是源表的行作为比较对象，
+    节点改名、外键变化 (关系换了终点)、关联表删行都能被识别。
+    状态保存在本地 SQLite 文件中，临时表放在磁盘上，内存占用与表大小无关。
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sync_rows (
+                    job    TEXT NOT NULL,
+                    key    TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    PRIMARY KEY (job, key)
+                ) WITHOUT ROWID
+                """
+            )
+
+    def _connect(self):
+        # sqlite 连接不能跨线程使用，并行同步时每个线程一个连接
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=60)
+            connection.execute("PRAGMA temp_store=FILE")
+            self._local.connection = connection
+        return connection
+
+    def begin(self, job, key_fields=("id",), full=False):
+        """开始一个任务的比较，数据通过 SyncRun.diff 分批加入 (一次读取可以分发到多个任务)"""
+        return SyncRun(self._connect(), job, key_fields, full)
+
+    def forget_endpoints(self, label, ids):
+        """
+        清除以这些节点为起点或终点的关系状态
+
+        节点被 DETACH DELETE 后它的关系也不存在了；节点以相同 id 重新出现时，
+        这些关系要被当作新增重新写入。关系任务名为 rel:{起点标签}-{类型}->{终点标签}。
+        """
+        if not ids:
+            return
+        connection = self._connect()
+        with connection:
+            # 不声明类型的列保留原值类型，与 json_extract 取出的 id 比较
+            connection.execute("CREATE TEMP TABLE IF NOT EXISTS forget_ids (id)")
+            connection.execute("DELETE FROM temp.forget_ids")
+            connection.executemany("INSERT INTO temp.forget_ids (id) VALUES (?)", ((value,) for value in ids))
+            for pattern, position in ((f"rel:{label}-*", 0), (f"rel:*->{label}", 1)):
+                connection.execute(
+                    f"""
+                    DELETE FROM sync_rows
+                    WHERE job GLOB ? AND json_extract(key, '$[{position}]') IN (SELECT id FROM temp.forget_ids)
+                    """,
+                    (pattern,),
+                )
+            connection.execute("DELETE FROM temp.forget_ids")
+
+    def reset(self, job=None):
+        with self._connect() as connection:
+            if job is None:
+                connection.execute("DELETE FROM sync_rows")
+            else:
+                connection.execute("DELETE FROM sync_rows WHERE job = ?", (job,))
+
+
+class SyncRun:
+    # 同一连接上可能同时有多个 SyncRun (路由到多个关系写入目标)，临时表名各不相同
+    _ids = itertools.count()
+
+    def __init__(self, connection, job, key_fields, full):
+        self.connection = connection
+        self.job = job
+        self.key_fields = list(key_fields)
+        self.full = full
+        self.incoming = f"temp.incoming_{next(self._ids)}"
+        self._batches = itertools.count()
+        # written: 0 表示产出后还未确认写入 (见 diff 的 confirm 参数)，commit 时不记入状态
+        connection.execute(
+            f"""
+            CREATE TABLE {self.incoming} (
+                key     TEXT PRIMARY KEY,
+                digest  TEXT NOT NULL,
+                row     TEXT NOT NULL,
+                batch   INTEGER NOT NULL,
+                written INTEGER NOT NULL
+            )
+            """
+        )
+        connection.execute(f"CREATE INDEX {self.incoming}_batch ON {self.incoming.split('.')[1]} (batch)")
+
+    def diff(self, rows, confirm=False):
+        """
+        逐批加入源数据，每批立即产出其中新增或内容变化的行 (full=True 时为全部行)
+
+        confirm=True 时产出的行要经 confirm() 确认写入后才会在 commit 时记入状态，
+        未确认的行 (例如关系的端点不存在) 即使上次记录过也会从状态中清除，下次同步重新写入。
+        """
+        iterator = iter(rows)
+        while True:
+            chunk = list(itertools.islice(iterator, FETCH_SIZE))
+            if not chunk:
+                return
+            batch = next(self._batches)
+            with self.connection:
+                self.connection.executemany(
+                    f"INSERT OR REPLACE INTO {self.incoming} (key, digest, row, batch, written) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (_key(row, self.key_fields), _digest(row), json.dumps(row, ensure_ascii=False, default=str),
+                         batch, 1)
+                        for row in chunk
+                    ),
+                )
+            if self.full:
+                cursor = self.connection.execute(f"SELECT key, row FROM {self.incoming} WHERE batch = ?", (batch,))
+            else:
+                cursor = self.connection.execute(
+                    f"""
+                    SELECT i.key, i.row
+                    FROM {self.incoming} i
+                    LEFT JOIN sync_rows s ON s.job = ? AND s.key = i.key
+                    WHERE i.batch = ? AND (s.digest IS NULL OR s.digest <> i.digest)
+                    """,
+                    (self.job, batch),
+                )
+            changed = cursor.fetchall()
+            if confirm:
+                with self.connection:
+                    self.connection.executemany(
+                        f"UPDATE {self.incoming} SET written = 0 WHERE key = ?", ((key,) for key, _ in changed)
+                    )
+            for _, row in changed:
+                yield json.loads(row)
+
+    def confirm(self, rows):
+        """确认这些行 (至少包含键字段) 已写入 Neo4j"""
+        with self.connection:
+            self.connection.executemany(
+                f"UPDATE {self.incoming} SET written = 1 WHERE key = ?",
+                ((_key(row, self.key_fields),) for row in rows),
+            )
+
+    def deleted_keys(self):
+        """上次同步过、本次源数据中已经不存在的键，形如 {"id": 1} 或 {"start_id": 1, "end_id": 2}"""
+        cursor = self.connection.execute(
+            f"""
+            SELECT s.key
+            FROM sync_rows s
+            WHERE s.job = ? AND NOT EXISTS (SELECT 1 FROM {self.incoming} i WHERE i.key = s.key)
+            """,
+            (self.job,),
+        )
+        return [dict(zip(self.key_fields, json.loads(key))) for (key,) in cursor.fetchall()]
+
+    def commit(self):
+        with self.connection:
+            self.connection.execute(
+                f"DELETE FROM sync_rows WHERE job = ? AND key NOT IN (SELECT key FROM {self.incoming} WHERE written = 1)",
+                (self.job,),
+            )
+            self.connection.execute(
+                f"""
+                INSERT OR REPLACE INTO sync_rows (job, key, digest)
+                SELECT ?, key, digest FROM {self.incoming} WHERE written = 1
+                """,
+                (self.job,),
+            )
+        self.close()
+
+    def close(self):
+        self.connection.execute(f"DROP TABLE IF EXISTS {self.incoming}")
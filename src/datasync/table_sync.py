@@ -1,336 +1,208 @@
-from datasync.utils import MysqlReader, Neo4jWriter
+import argparse
+import sys
+import threading
+import time
+
+from common.graph_db import Neo4jConnections
+from common.metrics import registry
+from common.signals import GraphChangeSignal
+from conf import config
+from datasync.mapping import load_mapping
+from datasync.scheduler import SyncJob, SyncScheduler, print_report
+from datasync.state import SyncState
+from datasync.utils import MysqlReader, Neo4jWriter, batched
+
+SYNC_ROWS = registry.counter("datasync_rows_total", "Rows written to Neo4j by sync job", ["job"])
+SYNC_DURATION = registry.gauge(
+    "datasync_job_duration_seconds", "Wall-clock time of the last run of a sync job", ["job"]
+)
+SYNC_THROUGHPUT = registry.gauge(
+    "datasync_rows_per_second", "Rows per second of the last run of a sync job", ["job"]
+)
+SYNC_LAST_SUCCESS = registry.gauge(
+    "datasync_last_success_timestamp_seconds", "Unix time a sync job last finished", ["job"]
+)
+SYNC_DELETED = registry.counter(
+    "datasync_deleted_total", "Nodes/relationships deleted because their source rows disappeared", ["job"]
+)
+
+
+def timed(job, writer, func):
+    """包装同步任务，记录耗时、写入行数和吞吐"""
+
+    def run():
+        rows_before = writer.thread_rows_written
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        rows = writer.thread_rows_written - rows_before
+        SYNC_ROWS.labels(job).inc(rows)
+        SYNC_DURATION.labels(job).set(elapsed)
+        SYNC_THROUGHPUT.labels(job).set(rows / elapsed if elapsed > 0 else 0.0)
+        SYNC_LAST_SUCCESS.labels(job).set(time.time())
+        print(f"{job}: {rows} 行, {elapsed:.2f}s, {rows / elapsed if elapsed > 0 else 0:.0f} 行/秒")
+
+    return run
 
 
 class TableSynchronizer:
-    def __init__(self):
-        self.mysql_reader = MysqlReader()
-        self.neo4j_writer = Neo4jWriter()
-
-    def sync_base_category1(self):
-        sql = """
-              SELECT id,
-                     name
-              FROM base_category1
-              """
-
-        self.neo4j_writer.write_nodes(label="Category1", batch_data=self.mysql_reader.read_data(sql))
-
-    def sync_base_category2(self):
-        sql = """
-              SELECT id,
-                     name
-              FROM base_category2
-              """
-        self.neo4j_writer.write_nodes(label="Category2", batch_data=self.mysql_reader.read_data(sql))
-
-    def sync_base_category3(self):
-        sql = """
-              SELECT id,
-                     name
-              FROM base_category3
-              """
-        self.neo4j_writer.write_nodes(label="Category3", batch_data=self.mysql_reader.read_data(sql))
-
-    def sync_category1_category2(self):
-        sql = """
-              SELECT c2.id           AS start_id,
-                     c2.category1_id AS end_id
-              FROM base_category2 c2
-              """
-
-        relationships = self.mysql_reader.read_data(sql)
-        self.neo4j_writer.write_relationships(
-            start_node_label="Category2",
-            end_node_label="Category1",
-            relationships=relationships,
-            relationship_type="Belong",
-        )
-
-    def sync_category2_category3(self):
-        sql = """
-              SELECT c3.id           AS start_id,
-                     c3.category2_id AS end_id
-              FROM base_category3 c3
-              """
-
-        relationships = self.mysql_reader.read_data(sql)
-        self.neo4j_writer.write_relationships(
-            start_node_label="Category3",
-            end_node_label="Category2",
-            relationships=relationships,
-            relationship_type="Belong",
-        )
-
-    def sync_base_attr(self):
-        sql = """
-              SELECT id,
-                     attr_name AS name
-              FROM base_attr_info
-              """
-        self.neo4j_writer.write_nodes(label="BaseAttr", batch_data=self.mysql_reader.read_data(sql))
-
-    def sync_base_attr_category(self):
-        sql = """
-              SELECT id          end_id,
-                     category_id start_id,
-                     category_level
-              FROM base_attr_info
-              """
-        relationships = self.mysql_reader.read_data(sql)
-        base_attr_category3 = [{"start_id": r["start_id"], "end_id": r["end_id"]} for r in relationships if
-                               r["category_level"] == 3]
-        self.neo4j_writer.write_relationships(
-            start_node_label="Category3",
-            end_node_label="BaseAttr",
-            relationships=base_attr_category3,
-            relationship_type="Have",
-        )
-
-        base_attr_category2 = [{"start_id": r["start_id"], "end_id": r["end_id"]} for r in relationships if
-                               r["category_level"] == 2]
-        self.neo4j_writer.write_relationships(
-            start_node_label="Category2",
-            end_node_label="BaseAttr",
-            relationships=base_attr_category2,
-            relationship_type="Have",
-        )
-
-        base_attr_category1 = [{"start_id": r["start_id"], "end_id": r["end_id"]} for r in relationships if
-                               r["category_level"] == 1]
-        self.neo4j_writer.write_relationships(
-            start_node_label="Category1",
-            end_node_label="BaseAttr",
-            relationships=base_attr_category1,
-            relationship_type="Have",
+    """
+    MySQL -> Neo4j 同步，同步内容由映射文件 (config.DATASYNC_MAPPING_FILE) 声明
+
+    每个映射项编译成一个同步任务: 一次流式读取 MySQL，按批写入 Neo4j。
+    节点任务产出标签，关系任务依赖两端标签，由 SyncScheduler 按依赖并行执行。
+
+    默认增量同步: 每个写入目标把本次读出的行逐批与上次写入的行 (SyncState) 比较，
+    只写入新增/修改的行，并删除源表中已经消失的节点和关系，写入量与变更量成正比。
+    full=True 时忽略上次的状态全部重写 (删除检测照常进行)，并重建状态。
+    """
+
+    def __init__(self, full=False, mapping=None):
+        self.full = full
+        self.mapping = mapping or load_mapping(config.DATASYNC_MAPPING_FILE)
+        # MySQL 连接不能被多个线程同时使用，并行同步时每个工作线程一个连接
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self.neo4j = Neo4jConnections(config.NEO4J_CONFIG)
+        self.neo4j_writer = Neo4jWriter(self.neo4j, change_signal=GraphChangeSignal(config.GRAPH_CHANGE_FILE))
+        self.state = SyncState(config.DATASYNC_STATE_FILE)
+
+    @property
+    def mysql_reader(self):
+        reader = getattr(self._local, "mysql_reader", None)
+        if reader is None:
+            reader = MysqlReader()
+            self._local.mysql_reader = reader
+            with self._readers_lock:
+                self._readers.append(reader)
+        return reader
+
+    @property
+    def labels(self):
+        return [node.label for node in self.mapping.nodes]
+
+    def jobs(self):
+        """映射中的所有同步任务，按声明顺序"""
+        jobs = [
+            SyncJob(node.job, timed(node.job, self.neo4j_writer, lambda node=node: self.sync_nodes(node)),
+                    produces=(node.label,))
+            for node in self.mapping.nodes
+        ]
+        for relationship in self.mapping.relationships:
+            depends = tuple(dict.fromkeys(relationship.start.labels + relationship.end.labels))
+            run = timed(relationship.job, self.neo4j_writer,
+                        lambda relationship=relationship: self.sync_relationships(relationship))
+            jobs.append(SyncJob(relationship.job, run, depends=depends))
+        return jobs
+
+    def sync_nodes(self, node):
+        job = f"node:{node.label}"
+        run = self.state.begin(job, key_fields=["id"], full=self.full)
+        try:
+            # 逐批比较、逐批写入，读取 MySQL 的下一块与写入当前批仍然重叠进行
+            self.neo4j_writer.write_nodes(label=node.label, batch_data=run.diff(self.mysql_reader.stream(node.sql())))
+            deleted_ids = [key["id"] for key in run.deleted_keys()]
+            deleted = self.neo4j_writer.delete_nodes(node.label, deleted_ids)
+            # DETACH DELETE 连带删除了这些节点的关系，节点以相同 id 重新出现时关系要重新写入
+            self.state.forget_endpoints(node.label, deleted_ids)
+            run.commit()
+        finally:
+            run.close()
+        SYNC_DELETED.labels(job).inc(deleted)
+
+    def sync_relationships(self, relationship):
+        """
+        一次读取，按路由分发到各个 (起点标签, 终点标签) 写入目标
+
+        例如 base_attr_info 只读一遍，按 category_level 分别写入 Category1/2/3 -[:Have]-> BaseAttr。
+        只有两端节点都存在、真正写入的关系才记入增量状态，端点缺失的关系下次同步重试。
+        """
+        runs = {
+            (start, end): self.state.begin(f"rel:{start}-{relationship.type}->{end}",
+                                           key_fields=["start_id", "end_id"], full=self.full)
+            for start, end in relationship.targets()
+        }
+        try:
+            rows = self.mysql_reader.stream(relationship.sql())
+            if not relationship.routed:
+                (start, end), run = next(iter(runs.items()))
+                self.neo4j_writer.write_relationships(
+                    start_node_label=start,
+                    end_node_label=end,
+                    relationships=run.diff(rows, confirm=True),
+                    relationship_type=relationship.type,
+                    on_written=run.confirm,
+                )
+            else:
+                self._write_routed(relationship, rows, runs)
+
+            for (start, end), run in runs.items():
+                deleted = self.neo4j_writer.delete_relationships(start, end, run.deleted_keys(), relationship.type)
+                run.commit()
+                SYNC_DELETED.labels(f"rel:{start}-{relationship.type}->{end}").inc(deleted)
+        finally:
+            for run in runs.values():
+                run.close()
+
+    def _write_routed(self, relationship, rows, runs):
+        """按 MySQL 读取的块路由、比较并写入，各写入目标汇总后统一打印和发送变更信号"""
+        written = {target: 0 for target in runs}
+        start_time = time.perf_counter()
+        for batch in batched(rows, config.MYSQL_FETCH_SIZE):
+            routed = {target: [] for target in runs}
+            for row in batch:
+                target = relationship.route(row)
+                if target is not None:
+                    routed[target].append({"start_id": row["start_id"], "end_id": row["end_id"]})
+            for (start, end), target_rows in routed.items():
+                if not target_rows:
+                    continue
+                run = runs[(start, end)]
+                written[(start, end)] += self.neo4j_writer.write_relationships(
+                    start_node_label=start,
+                    end_node_label=end,
+                    relationships=run.diff(target_rows, confirm=True),
+                    relationship_type=relationship.type,
+                    on_written=run.confirm,
+                    report=False,
+                )
+        elapsed = time.perf_counter() - start_time
+        for (start, end), count in written.items():
+            print(f"写入 ({start})-[:{relationship.type}]->({end}) 关系 {count} 行, 耗时 {elapsed:.2f}s")
+            if count:
+                self.neo4j_writer.notify_changed([start, end])
+
+    def close(self):
+        for reader in self._readers:
+            reader.close()
+        self.neo4j_writer.close()
+        self.neo4j.close()
+
+
+def run_sync(full=False, resume=False, workers=None):
+    syncer = TableSynchronizer(full=full)
+    try:
+        # 预先为所有标签创建 id 唯一约束
+        syncer.neo4j_writer.ensure_constraints(syncer.labels)
+        scheduler = SyncScheduler(
+            syncer.jobs(),
+            workers=workers or config.DATASYNC_WORKERS,
+            progress_file=config.DATASYNC_PROGRESS_FILE,
         )
-
-    def sync_base_attr_value(self):
-        sql = """
-              select id,
-                     value_name name
-              from base_attr_value
-              """
-        self.neo4j_writer.write_nodes(label="BaseAttrValue", batch_data=self.mysql_reader.read_data(sql))
-
-    def sync_base_attr_value_attr(self):
-        sql = """
-              select id      end_id,
-                     attr_id start_id
-              from base_attr_value
-              """
-        relationships = self.mysql_reader.read_data(sql)
-        self.neo4j_writer.write_relationships(
-            start_node_label="BaseAttr",
-            end_node_label="BaseAttrValue",
-            relationships=relationships,
-            relationship_type="Have",
-        )
-
-    def sync_spu(self):
-        sql = """
-              select id,
-                     spu_name name
-              from spu_info
-              """
-        self.neo4j_writer.write_nodes(label="SPU", batch_data=self.mysql_reader.read_data(sql))
-
-    def sync_spu_category3(self):
-        sql = """
-              select id           start_id,
-                     category3_id end_id
-              from spu_info
-              """
-        relationships = self.mysql_reader.read_data(sql)
-        self.neo4j_writer.write_relationships(
-            start_node_label="SPU",
-            end_node_label="Category3",
-            relationships=relationships,
-            relationship_type="Belong",
-        )
-
-    def sync_sale_attr(self):
-        sql = """
-              select id,
-                     sale_attr_name name
-              from spu_sale_attr
-              """
-        self.neo4j_writer.write_nodes(label="SaleAttr", batch_data=self.mysql_reader.read_data(sql))
-
-    def sync_sale_attr_spu(self):
-        sql = """
-              select id     end_id,
-                     spu_id start_id
-              from spu_sale_attr
-              """
-        relationships = self.mysql_reader.read_data(sql)
-        self.neo4j_writer.write_relationships(
-            start_node_label="SPU",
-            end_node_label="SaleAttr",
-            relationships=relationships,
-            relationship_type="Have",
-        )
-
-    def sync_sale_attr_value(self):
-        sql = """
-              select id,
-                     sale_attr_value_name name
-              from spu_sale_attr_value
-              """
-        self.neo4j_writer.write_nodes(label="SaleAttrValue", batch_data=self.mysql_reader.read_data(sql))
-
-    def sync_sale_attr_value_attr(self):
-        sql = """
-              select a.id start_id,
-                     v.id end_id
-              from spu_sale_attr_value v
-                       join spu_sale_attr a on v.spu_id = a.spu_id and v.base_sale_attr_id = a.base_sale_attr_id
-              """
-        relationships = self.mysql_reader.read_data(sql)
-        self.neo4j_writer.write_relationships(
-            start_node_label="SaleAttr",
-            end_node_label="SaleAttrValue",
-            relationships=relationships,
-            relationship_type="Have",
-        )
-
-    def sync_sku(self):
-        sql = """
-              select id,
-                     sku_name name
-              from sku_info
-              """
-        self.neo4j_writer.write_nodes(label="SKU", batch_data=self.mysql_reader.read_data(sql))
-
-    def sync_sku_base_attr_value(self):
-        sql = """
-              select sku_id   start_id,
-                     value_id end_id
-              from sku_attr_value
-              """
-        relationships = self.mysql_reader.read_data(sql)
-        self.neo4j_writer.write_relationships(
-            start_node_label="SKU",
-            end_node_label="BaseAttrValue",
-            relationships=relationships,
-            relationship_type="Have",
-        )
-
-    def sync_sku_sale_attr_value(self):
-        sql = """
-              select sku_id             start_id,
-                     sale_attr_value_id end_id
-              from sku_sale_attr_value
-              """
-        relationships = self.mysql_reader.read_data(sql)
-        self.neo4j_writer.write_relationships(
-            start_node_label="SKU",
-            end_node_label="SaleAttrValue",
-            relationships=relationships,
-            relationship_type="Have",
-        )
-
-    def sync_sku_spu(self):
-        sql = """
-              select id     start_id,
-                     spu_id end_id
-              from sku_info
-              """
-        relationships = self.mysql_reader.read_data(sql)
-        self.neo4j_writer.write_relationships(
-            start_node_label="SKU",
-            end_node_label="SPU",
-            relationships=relationships,
-            relationship_type="Belong",
-        )
-
-    def sync_base_trademark(self):
-        sql = """
-              select id,
-                     tm_name name
-              from base_trademark
-              """
-        self.neo4j_writer.write_nodes(label="BaseTrademark", batch_data=self.mysql_reader.read_data(sql))
-
-    def sync_base_trademark_spu(self):
-        sql = """
-              select id    start_id,
-                     tm_id end_id
-              from spu_info \
-              """
-        relationships = self.mysql_reader.read_data(sql)
-        self.neo4j_writer.write_relationships(start_node_label="SPU",
-                                              end_node_label="BaseTrademark",
-                                              relationships=relationships,
-                                              relationship_type='Belong')
-
-
-def run_sync():
-    syncer = TableSynchronizer()
-    syncer.sync_base_category1()
-    syncer.sync_base_category2()
-    syncer.sync_base_category3()
-    syncer.sync_category1_category2()
-    syncer.sync_category2_category3()
-    syncer.sync_base_attr()
-    syncer.sync_base_attr_category()
-    syncer.sync_base_attr_value()
-    syncer.sync_base_attr_value_attr()
-    syncer.sync_spu()
-    syncer.sync_spu_category3()
-    syncer.sync_sale_attr()
-    syncer.sync_sale_attr_spu()
-    syncer.sync_sale_attr_value()
-    syncer.sync_sale_attr_value_attr()
-    syncer.sync_sku()
-    syncer.sync_sku_base_attr_value()
-    syncer.sync_sku_sale_attr_value()
-    syncer.sync_sku_spu()
-    syncer.sync_base_trademark()
-
-
-if __name__ == "__main__":
-    synchronizer = TableSynchronizer()
-    synchronizer.sync_base_trademark_spu()
-
-
-
+        report = scheduler.run(resume=resume)
+        print_report(report)
+    finally:
+        syncer.close()
+        registry.write_textfile(config.DATASYNC_METRICS_FILE)
+    return report
 
 
 if __name__ == '__main__':
-    synchronizer = TableSynchronizer()
-    # 同步分类系统
-    synchronizer.sync_base_category1()
-    synchronizer.sync_base_category2()
-    synchronizer.sync_base_category3()
-    synchronizer.sync_category1_category2()
-    synchronizer.sync_category2_category3()
-
-    # 同步属性系统
-    synchronizer.sync_base_attr()
-    synchronizer.sync_base_attr_category()
-    synchronizer.sync_base_attr_value()
-    synchronizer.sync_base_attr_value_attr()
-
-    # 同步SPU
-    synchronizer.sync_spu()
-    synchronizer.sync_spu_category3()
-
-    # 同步销售属性
-    synchronizer.sync_sale_attr()
-    synchronizer.sync_sale_attr_spu()
-
-    # 同步销售属性值
-    synchronizer.sync_sale_attr_value()
-    synchronizer.sync_sale_attr_value_attr()
-
-    # 同步SKU
-    synchronizer.sync_sku()
-    synchronizer.sync_sku_spu()
-    synchronizer.sync_sku_base_attr_value()
-    synchronizer.sync_sku_sale_attr_value()
-
-    # 同步品牌
-    synchronizer.sync_base_trademark()
-
-    #
-    synchronizer.sync_base_trademark_spu()
+    parser = argparse.ArgumentParser(description="MySQL -> Neo4j 同步 (默认增量)")
+    parser.add_argument("--full", action="store_true", help="忽略增量状态，全部重写")
+    parser.add_argument("--resume", action="store_true", help="跳过上次失败前已完成的任务")
+    parser.add_argument("--workers", type=int, default=None, help="并行的同步任务数")
+    args = parser.parse_args()
+    result = run_sync(full=args.full, resume=args.resume, workers=args.workers)
+    sys.exit(0 if result.ok else 1)
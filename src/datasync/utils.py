@@ -1,9 +1,73 @@
+import queue
+import threading
+import time
+from itertools import islice
+
 import pymysql
-from neo4j import GraphDatabase
-from pymysql.cursors import DictCursor
+from pymysql.cursors import DictCursor, SSDictCursor
 
 from conf import config
 
+_END_OF_STREAM = object()
+
+
+def prefetch(chunks, depth=2):
+    """
+    在后台线程中迭代 chunks，最多预取 depth 块，逐行产出
+
+    读取下一块 (MySQL 网络 I/O) 与调用方处理当前块 (写 Neo4j) 重叠进行，
+    内存占用上限为 depth 块。
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for chunk in chunks:
+                if not put(chunk):
+                    return
+            put(_END_OF_STREAM)
+        except Exception as e:
+            put(e)
+
+    producer = threading.Thread(target=produce, name="mysql-prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _END_OF_STREAM:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield from item
+    finally:
+        # 调用方提前结束时通知生产线程退出
+        stopped.set()
+        producer.join()
+
+
+def batched(rows, size):
+    """把 list 或任意可迭代对象切分成 size 行一批"""
+    if isinstance(rows, list):
+        for i in range(0, len(rows), size):
+            yield rows[i: i + size]
+        return
+    iterator = iter(rows)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
 
 class MysqlReader:
     def __init__(self):
@@ -34,42 +98,187 @@ class MysqlReader:
         self.cursor.execute(sql)
         return self.cursor.fetchall()
 
+    def read_chunks(self, sql, chunk_size=None):
+        """
+        使用服务端游标 (SSDictCursor) 分块读取，不会把整张表加载到内存
+
+        注意: 游标读完之前该连接不能执行其他查询。
+        """
+        chunk_size = chunk_size or config.MYSQL_FETCH_SIZE
+        with self.connection.cursor(SSDictCursor) as cursor:
+            cursor.execute(sql)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield rows
+
+    def stream(self, sql, chunk_size=None):
+        """逐行产出查询结果，后台预取下一块，可直接交给 Neo4jWriter 写入"""
+        return prefetch(self.read_chunks(sql, chunk_size))
+
     def close(self):
         self.cursor.close()
         self.connection.close()
 
 
 class Neo4jWriter:
-    def __init__(self):
-        self.neo4j_driver = GraphDatabase.driver(
-            uri=config.NEO4J_CONFIG["url"],
-            auth=(config.NEO4J_CONFIG["user"], config.NEO4J_CONFIG["password"]),
-        )
+    def __init__(self, neo4j, change_signal=None, batch_size=None):
+        # 进程共享的连接池 (common.graph_db.Neo4jConnections)，SyncScheduler 的各工作线程各自开 session
+        self.neo4j_driver = neo4j.driver
+        self.database = neo4j.database
+        self.batch_size = batch_size or config.NEO4J_BATCH_SIZE
+        # 写入后通过 GraphChangeSignal 通知 Web 服务刷新 schema、清理该标签的缓存
+        self.change_signal = change_signal
+        # 累计写入的行数；并行同步时每个线程另外单独计数，用于统计每个同步任务的吞吐
+        self.rows_written = 0
+        self._local = threading.local()
+        # 已确认存在 id 唯一约束的标签
+        self._constrained_labels = set()
+        # 并行写入时保护计数器和变更信号文件
+        self._lock = threading.Lock()
+
+    def notify_changed(self, labels):
+        if self.change_signal is not None:
+            with self._lock:
+                self.change_signal.notify(labels, source="datasync")
+
+    def ensure_constraints(self, labels):
+        """
+        为标签创建 id 唯一约束 (同时生成索引)
+
+        MERGE 与关系写入时的 MATCH 都按 id 查找节点，没有索引时每个批次都要全标签扫描。
+        """
+        for label in labels:
+            if label in self._constrained_labels:
+                continue
+            self.neo4j_driver.execute_query(
+                f"CREATE CONSTRAINT {label.lower()}_id_unique IF NOT EXISTS "
+                f"FOR (n:{label}) REQUIRE n.id IS UNIQUE",
+                database_=self.database,
+            )
+            self._constrained_labels.add(label)
+
+    def _run_batches(self, cypher, rows, batch_size):
+        """
+        每个批次一个显式写事务，逐批产出 (batch, 返回的记录, 更新计数 SummaryCounters)
+
+        rows 可以是 list 或 MysqlReader.stream() 的流。
+        """
+        with self.neo4j_driver.session(database=self.database) as session:
+            for batch in batched(rows, batch_size or self.batch_size):
+                records, counters = session.execute_write(self._run_batch, cypher, batch)
+                yield batch, records, counters
+
+    def _count_written(self, written):
+        with self._lock:
+            self.rows_written += written
+        self._local.rows_written = self.thread_rows_written + written
+
+    @property
+    def thread_rows_written(self):
+        """当前线程累计写入的行数 (不含删除)"""
+        return getattr(self._local, "rows_written", 0)
+
+    @staticmethod
+    def _run_batch(tx, cypher, batch):
+        result = tx.run(cypher, batch=batch)
+        records = [record.data() for record in result]
+        return records, result.consume().counters
 
     """
-      UNWIND 把 batch 中的每个对象展开成 row；MERGE 根据 id 和 name 创建（或复用）节点。  
+      UNWIND 把 batch 中的每个对象展开成 row；MERGE 只按 id 创建（或复用）节点，再用 SET += 写入其余属性，
+      这样 MERGE 能命中 id 唯一约束的索引，name 变化时也不会产生重复节点。
     """
 
-    def write_nodes(self, label, batch_data, batch_size=20):
-        for i in range(0, len(batch_data), batch_size):
-            batch = batch_data[i: i + batch_size]
-            properties = {"batch": batch}
-            cypher = f"""
-            UNWIND $batch AS row
-            MERGE (n:{label} {{id: row.id, name: row.name}})
-            """
-            print(cypher)
-            # 使用 execute_query 方法执行查询
-            self.neo4j_driver.execute_query(cypher, parameters_=properties)
-
-    def write_relationships(self, start_node_label, end_node_label, relationships, relationship_type, batch_size=20):
-        for i in range(0, len(relationships), batch_size):
-            batch = relationships[i: i + batch_size]
-            properties = {"batch": batch}
-            cypher = f"""
-            UNWIND $batch AS row
-            MATCH (start:{start_node_label} {{id: row.start_id}}),
-                  (end:{end_node_label} {{id: row.end_id}})
-            MERGE (start)-[:{relationship_type}]->(end)
-            """
-            self.neo4j_driver.execute_query(cypher, parameters_=properties)
+    def write_nodes(self, label, batch_data, batch_size=None):
+        self.ensure_constraints([label])
+        cypher = f"""
+        UNWIND $batch AS row
+        MERGE (n:{label} {{id: row.id}})
+        SET n += row
+        """
+        start = time.perf_counter()
+        written = 0
+        for batch, _, _ in self._run_batches(cypher, batch_data, batch_size):
+            written += len(batch)
+        self._count_written(written)
+        self._report(f"{label} 节点", written, time.perf_counter() - start)
+        if written:
+            self.notify_changed([label])
+        return written
+
+    def write_relationships(self, start_node_label, end_node_label, relationships, relationship_type, batch_size=None,
+                            on_written=None, report=True):
+        """
+        写入关系，返回实际写入的条数
+
+        两端节点有一端不存在的行 MATCH 不到，不会写入，也不计数。
+        on_written 每批回调一次，参数为真正写入的 [{"start_id", "end_id"}]；
+        report=False 时不打印也不发送变更信号，由调用方汇总多次调用后处理。
+        """
+        self.ensure_constraints([start_node_label, end_node_label])
+        cypher = f"""
+        UNWIND $batch AS row
+        MATCH (start:{start_node_label} {{id: row.start_id}})
+        MATCH (end:{end_node_label} {{id: row.end_id}})
+        MERGE (start)-[:{relationship_type}]->(end)
+        RETURN row.start_id AS start_id, row.end_id AS end_id
+        """
+        start = time.perf_counter()
+        written = 0
+        for _, records, _ in self._run_batches(cypher, relationships, batch_size):
+            written += len(records)
+            if on_written is not None and records:
+                on_written(records)
+        self._count_written(written)
+        if report:
+            self._report(f"({start_node_label})-[:{relationship_type}]->({end_node_label}) 关系", written,
+                         time.perf_counter() - start)
+            if written:
+                self.notify_changed([start_node_label, end_node_label])
+        return written
+
+    def delete_nodes(self, label, ids, batch_size=None):
+        """
+        删除源表中已不存在的节点，连同其关系一起删除，返回实际删除的节点数
+
+        删除不计入写入行数 (rows_written)，不影响写入吞吐的统计。
+        """
+        if not ids:
+            return 0
+        cypher = f"""
+        UNWIND $batch AS id
+        MATCH (n:{label} {{id: id}})
+        DETACH DELETE n
+        """
+        deleted = sum(counters.nodes_deleted for _, _, counters in self._run_batches(cypher, ids, batch_size))
+        print(f"删除 {label} 节点 {deleted} 个")
+        if deleted:
+            self.notify_changed([label])
+        return deleted
+
+    def delete_relationships(self, start_node_label, end_node_label, relationships, relationship_type,
+                             batch_size=None):
+        """删除源表中已不存在的关系，relationships 为 [{"start_id": ..., "end_id": ...}]，返回实际删除的关系数"""
+        if not relationships:
+            return 0
+        cypher = f"""
+        UNWIND $batch AS row
+        MATCH (:{start_node_label} {{id: row.start_id}})-[r:{relationship_type}]->(:{end_node_label} {{id: row.end_id}})
+        DELETE r
+        """
+        deleted = sum(
+            counters.relationships_deleted for _, _, counters in self._run_batches(cypher, relationships, batch_size)
+        )
+        print(f"删除 ({start_node_label})-[:{relationship_type}]->({end_node_label}) 关系 {deleted} 条")
+        if deleted:
+            self.notify_changed([start_node_label, end_node_label])
+        return deleted
+
+    @staticmethod
+    def _report(target, rows, elapsed):
+        print(f"写入 {target} {rows} 行, 耗时 {elapsed:.2f}s, {rows / elapsed if elapsed > 0 else 0:.0f} 行/秒")
+
+    def close(self):
+        """driver 属于共享连接池，由创建方关闭"""
@@ -0,0 +1,147 @@
+import random
+from typing import Iterator, List, Optional, Sequence
+
+from torch.utils.data import DataLoader, Sampler
+from transformers import Trainer
+
+# 分批方式: random 为 Trainer 默认的随机分批 (固定 batch size)；
+# length 按长度分组，batch size 固定；tokens 按长度分组，每批 padding 后的 token 数不超过 max_tokens
+BATCHING_MODES = ("random", "length", "tokens")
+
+
+class BucketBatchSampler(Sampler[List[int]]):
+    """
+    按长度分组的批采样器
+
+    样本按长度排序 (长度相同的随机打乱) 后依次装批，同一批长度相近，padding 很少。
+    batch_size 限制每批条数，max_tokens 限制每批 padding 后的 token 数 (最长样本长度 × 条数)，
+    短标题的批自然更大。批的划分只计算一次 (len() 固定)，shuffle 时每轮只打乱批的顺序。
+    """
+
+    def __init__(
+        self,
+        lengths: Sequence[int],
+        batch_size: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        shuffle: bool = True,
+        seed: int = 42,
+    ):
+        if not batch_size and not max_tokens:
+            raise ValueError("batch_size 和 max_tokens 至少指定一个")
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+        rng = random.Random(seed)
+        order = sorted(range(len(lengths)), key=lambda i: (lengths[i], rng.random()))
+        self.batches: List[List[int]] = []
+        batch: List[int] = []
+        longest = 0
+        for i in order:
+            candidate = max(longest, lengths[i])
+            full = (batch_size and len(batch) >= batch_size) or (max_tokens and candidate * (len(batch) + 1) > max_tokens)
+            if batch and full:
+                self.batches.append(batch)
+                batch, candidate = [], lengths[i]
+            batch.append(i)
+            longest = candidate
+        if batch:
+            self.batches.append(batch)
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def __iter__(self) -> Iterator[List[int]]:
+        batches = list(self.batches)
+        if self.shuffle:
+            random.Random(self.seed + self.epoch).shuffle(batches)
+            # Trainer 不一定会调用 set_epoch，每轮迭代后自动进入下一轮
+            self.epoch += 1
+        return iter(batches)
+
+    def __len__(self) -> int:
+        return len(self.batches)
+
+
+class PaddingStats:
+    """包装 data collator，统计真实 token 占 padding 后 token 的比例 (只在 dataloader 主进程中计数)"""
+
+    def __init__(self, collator):
+        self.collator = collator
+        self.reset()
+
+    def reset(self):
+        self.samples = 0
+        self.batches = 0
+        self.real_tokens = 0
+        self.padded_tokens = 0
+
+    def __call__(self, features):
+        batch = self.collator(features)
+        mask = batch["attention_mask"]
+        self.samples += len(features)
+        self.batches += 1
+        self.real_tokens += int(mask.sum())
+        self.padded_tokens += mask.numel()
+        return batch
+
+    @property
+    def efficiency(self) -> float:
+        return self.real_tokens / self.padded_tokens if self.padded_tokens else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "samples": self.samples,
+            "batches": self.batches,
+            "avg_batch_size": self.samples / self.batches if self.batches else 0.0,
+            "padding_efficiency": round(self.efficiency, 4),
+        }
+
+
+class BucketTrainer(Trainer):
+    """
+    支持按长度分组 / token 预算分批的 Trainer
+
+    batching="random" 时与 Trainer 完全一致；其余模式替换训练和评估的 DataLoader 为 BucketBatchSampler。
+    """
+
+    def __init__(self, *args, batching: str = "random", max_tokens: Optional[int] = None, **kwargs):
+        if batching not in BATCHING_MODES:
+            raise ValueError(f"未知的分批方式: {batching}，可选 {BATCHING_MODES}")
+        if batching == "tokens" and not max_tokens:
+            raise ValueError("tokens 分批需要指定 max_tokens")
+        super().__init__(*args, **kwargs)
+        self.batching = batching
+        self.max_tokens = max_tokens
+
+    def _bucket_dataloader(self, dataset, batch_size: int, shuffle: bool, description: str) -> DataLoader:
+        lengths = [len(input_ids) for input_ids in dataset["input_ids"]]
+        sampler = BucketBatchSampler(
+            lengths,
+            batch_size=batch_size if self.batching == "length" else None,
+            max_tokens=self.max_tokens if self.batching == "tokens" else None,
+            shuffle=shuffle,
+            seed=self.args.seed,
+        )
+        dataloader = DataLoader(
+            self._remove_unused_columns(dataset, description=description),
+            batch_sampler=sampler,
+            collate_fn=self.data_collator,
+            num_workers=self.args.dataloader_num_workers,
+            pin_memory=self.args.dataloader_pin_memory,
+        )
+        return self.accelerator.prepare(dataloader)
+
+    def get_train_dataloader(self) -> DataLoader:
+        if self.batching == "random":
+            return super().get_train_dataloader()
+        return self._bucket_dataloader(
+            self.train_dataset, self.args.per_device_train_batch_size, shuffle=True, description="training"
+        )
+
+    def get_eval_dataloader(self, eval_dataset=None) -> DataLoader:
+        if self.batching == "random":
+            return super().get_eval_dataloader(eval_dataset)
+        dataset = eval_dataset if eval_dataset is not None else self.eval_dataset
+        return self._bucket_dataloader(
+            dataset, self.args.per_device_eval_batch_size, shuffle=False, description="evaluation"
+        )
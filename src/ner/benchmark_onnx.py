@@ -0,0 +1,102 @@
+import argparse
+import time
+
+import evaluate
+import numpy as np
+from datasets import load_from_disk
+
+from conf import config
+from ner.inference import NerPredictor, OnnxNerPredictor
+
+
+def load_batches(tokenizer, batch_size, limit=None):
+    """读取预处理好的 test 集，按 batch_size 动态 padding 成 numpy 批次"""
+    test_dataset = load_from_disk(config.PROCESS_DATA_DIR)["test"]
+    if limit:
+        test_dataset = test_dataset.select(range(min(limit, len(test_dataset))))
+    features = test_dataset.remove_columns(["labels"])
+    batches = []
+    for offset in range(0, len(test_dataset), batch_size):
+        rows = features[offset: offset + batch_size]
+        rows = [dict(zip(rows, values)) for values in zip(*rows.values())]
+        encoded = tokenizer.pad(rows, padding=True, return_tensors="np")
+        labels = test_dataset[offset: offset + batch_size]["labels"]
+        batches.append((encoded, labels))
+    return batches
+
+
+def run(predictor, batches):
+    """返回每个批次的 logits 和耗时 (秒)"""
+    predictor.logits(batches[0][0])  # 预热
+    outputs, latencies = [], []
+    for encoded, _ in batches:
+        start = time.perf_counter()
+        outputs.append(predictor.logits(encoded))
+        latencies.append(time.perf_counter() - start)
+    return outputs, latencies
+
+
+def to_label_sequences(id2label, logits_batches, batches):
+    predictions, references = [], []
+    for logits, (_, labels) in zip(logits_batches, batches):
+        preds = logits.argmax(axis=-1)
+        for pred, label in zip(preds, labels):
+            predictions.append([id2label[int(p)] for p, l in zip(pred, label) if l != -100])
+            references.append([id2label[int(l)] for l in label if l != -100])
+    return predictions, references
+
+
+def report(name, latencies, samples):
+    values = np.asarray(latencies) * 1000
+    total = sum(latencies)
+    print(
+        f"{name:<12} 每批 p50 {np.percentile(values, 50):7.1f}ms  p95 {np.percentile(values, 95):7.1f}ms  "
+        f"吞吐 {samples / total:8.1f} 条/秒"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ONNX 与 PyTorch NER 模型的一致性检查和速度对比 (test 集)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--limit", type=int, default=None, help="只使用 test 集前 N 条")
+    parser.add_argument("--threads", type=int, default=None, help="推理线程数 (默认由框架决定)")
+    args = parser.parse_args()
+
+    backends = {"pytorch": NerPredictor(config.NER_MODEL_DIR, config.MODEL_NAME, num_threads=args.threads)}
+    for name, file in (("onnx", config.NER_ONNX_MODEL_FILE), ("onnx-int8", config.NER_ONNX_QUANTIZED_FILE)):
+        path = config.NER_ONNX_DIR / file
+        if path.exists():
+            backends[name] = OnnxNerPredictor(path, num_threads=args.threads)
+        else:
+            print(f"跳过 {name}: {path} 不存在 (先运行 export_onnx.py)")
+
+    reference = backends["pytorch"]
+    batches = load_batches(reference.tokenizer, args.batch_size, args.limit)
+    samples = sum(len(labels) for _, labels in batches)
+    seqeval = evaluate.load("seqeval")
+
+    results = {name: run(predictor, batches) for name, predictor in backends.items()}
+    reference_logits = results["pytorch"][0]
+
+    print(f"\ntest 集 {samples} 条，batch_size={args.batch_size}")
+    for name, (logits_batches, latencies) in results.items():
+        report(name, latencies, samples)
+
+    print("\n一致性 (相对 PyTorch) 与准确率:")
+    for name, (logits_batches, _) in results.items():
+        # 只比较有标签的位置 (与评估口径一致)
+        agree = total = 0
+        max_diff = 0.0
+        for logits, expected, (_, labels) in zip(logits_batches, reference_logits, batches):
+            mask = np.full(logits.shape[:2], False)
+            for row, label in enumerate(labels):
+                mask[row, :len(label)] = np.asarray(label) != -100
+            agree += int((logits.argmax(-1) == expected.argmax(-1))[mask].sum())
+            total += int(mask.sum())
+            max_diff = max(max_diff, float(np.abs(logits - expected)[mask].max(initial=0.0)))
+        predictions, references = to_label_sequences(reference.id2label, logits_batches, batches)
+        metrics = seqeval.compute(predictions=predictions, references=references)
+        print(
+            f"{name:<12} 标签一致率 {agree / max(total, 1):.4%}  logits 最大差 {max_diff:.2e}  "
+            f"F1 {metrics['overall_f1']:.4f}"
+        )
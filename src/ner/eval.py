@@ -1,3 +1,5 @@
+import argparse
+
 import evaluate
 from datasets import load_from_disk
 from transformers import (
@@ -5,10 +7,17 @@ from transformers import (
     AutoTokenizer,
     DataCollatorForTokenClassification,
     EvalPrediction,
-    Trainer,
+    TrainingArguments,
 )
 
 from conf import config
+from ner.batching import BATCHING_MODES, BucketTrainer, PaddingStats
+
+parser = argparse.ArgumentParser(description="在 test 集上评估 NER 模型")
+parser.add_argument("--batching", choices=BATCHING_MODES, default=config.BATCHING, help="分批方式")
+parser.add_argument("--max-tokens", type=int, default=config.MAX_TOKENS_PER_BATCH, help="tokens 分批时每批最大 token 数")
+parser.add_argument("--batch-size", type=int, default=config.BATCH_SIZE)
+args = parser.parse_args()
 
 
 # 1. 加载测试集（预处理时 save_to_disk 得到的数据集字典，取出 test split）
@@ -20,7 +29,7 @@ model = AutoModelForTokenClassification.from_pretrained(config.CHECKPOINT_DIR /
 
 # 4. 加载分词器 & data_collator
 tokenizer = AutoTokenizer.from_pretrained(config.MODEL_NAME)
-data_collator = DataCollatorForTokenClassification(tokenizer=tokenizer, padding=True, return_tensors="pt")
+data_collator = PaddingStats(DataCollatorForTokenClassification(tokenizer=tokenizer, padding=True, return_tensors="pt"))
 
 # 5. 定义评估函数
 seqeval = evaluate.load("seqeval")
@@ -45,13 +54,21 @@ def compute_metrics(prediction: EvalPrediction) -> dict:
 
 
 # 6. 使用 Trainer 进行评估
-trainer = Trainer(
+trainer = BucketTrainer(
     model=model,
+    args=TrainingArguments(
+        output_dir=str(config.CHECKPOINT_DIR / "ner" / "eval"),
+        per_device_eval_batch_size=args.batch_size,
+    ),
     tokenizer=tokenizer,
     eval_dataset=test_dataset,
     data_collator=data_collator,
     compute_metrics=compute_metrics,
+    batching=args.batching,
+    max_tokens=args.max_tokens,
 )
 
 metrics = trainer.evaluate()
 print("评估结果", metrics)
+print(f"分批方式: {args.batching}，评估速度: {metrics['eval_samples_per_second']:.2f} 条/秒")
+print("padding 统计", data_collator.summary())
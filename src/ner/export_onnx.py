@@ -0,0 +1,66 @@
+import argparse
+import time
+
+import torch
+from transformers import AutoModelForTokenClassification, AutoTokenizer
+
+from conf import config
+
+
+def export(model_dir, output_dir, opset=14):
+    """
+    把训练好的 Token 分类模型导出为 ONNX
+
+    batch 和序列长度两个维度都是动态的；模型配置 (id2label) 和分词器保存在同一目录，
+    OnnxNerPredictor 只需要这个目录即可推理，不再依赖 torch。
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    model = AutoModelForTokenClassification.from_pretrained(model_dir)
+    model.eval()
+    # Trainer.save_model 没有保存分词器，使用训练时的预训练分词器
+    tokenizer = AutoTokenizer.from_pretrained(config.MODEL_NAME)
+
+    dummy = tokenizer([list("华为手机")], is_split_into_words=True, return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch", 1: "sequence"}
+
+    model_path = output_dir / config.NER_ONNX_MODEL_FILE
+    start = time.perf_counter()
+    with torch.no_grad():
+        # BertForTokenClassification.forward 的前三个位置参数依次为 input_ids, attention_mask, token_type_ids
+        torch.onnx.export(
+            model,
+            tuple(dummy[name] for name in input_names),
+            str(model_path),
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    model.config.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    print(f"已导出 ONNX 模型: {model_path}，耗时 {time.perf_counter() - start:.1f}s")
+    return model_path
+
+
+def quantize(model_path, output_path):
+    """int8 动态量化: 权重离线量化为 int8，激活在推理时动态量化，CPU 上矩阵乘法更快、模型约缩小 4 倍"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(str(model_path), str(output_path), weight_type=QuantType.QInt8)
+    size_before = model_path.stat().st_size / 1024 / 1024
+    size_after = output_path.stat().st_size / 1024 / 1024
+    print(f"已量化: {output_path} ({size_before:.0f}MB -> {size_after:.0f}MB)")
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="导出 NER 模型为 ONNX (可选 int8 动态量化)")
+    parser.add_argument("--quantize", action="store_true", help="同时生成 int8 动态量化模型")
+    parser.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+
+    onnx_path = export(config.NER_MODEL_DIR, config.NER_ONNX_DIR, opset=args.opset)
+    if args.quantize:
+        quantize(onnx_path, config.NER_ONNX_DIR / config.NER_ONNX_QUANTIZED_FILE)
@@ -0,0 +1,122 @@
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from transformers import AutoTokenizer
+
+
+def decode_spans(text: str, char_labels: Sequence[str]) -> List[Dict]:
+    """
+    把逐字符的 B/I/O 标签解码为实体片段，格式与标注数据一致: {"start", "end", "text"}
+
+    孤立的 I (前面不是 B/I) 也视为实体开始。
+    """
+    spans = []
+    start = None
+    for i, label in enumerate(list(char_labels) + ["O"]):
+        if label == "B" or (label == "I" and start is None):
+            if start is not None:
+                spans.append({"start": start, "end": i, "text": text[start:i]})
+            start = i
+        elif label == "O" and start is not None:
+            spans.append({"start": start, "end": i, "text": text[start:i]})
+            start = None
+    return spans
+
+
+def char_labels_from_tokens(text: str, word_ids: Sequence[Optional[int]], token_labels: Sequence[str]) -> List[str]:
+    """按 word_ids 把 token 级标签映射回字符 (每个字符取其第一个 token 的标签)"""
+    labels = ["O"] * len(text)
+    previous = None
+    for word_id, label in zip(word_ids, token_labels):
+        if word_id is not None and word_id != previous:
+            labels[word_id] = label
+        previous = word_id
+    return labels
+
+
+class BaseNerPredictor:
+    """
+    B/I/O 实体识别推理的公共部分: 分词、按长度分批、解码
+
+    与训练时一致，文本按字符切分后以 is_split_into_words 方式分词。
+    一次 predict 的多条文本按长度排序后分批，同一批长度相近，padding 最少。
+    子类只需实现 logits(encoded)，encoded 为 numpy 数组组成的 BatchEncoding。
+    """
+
+    def __init__(self, tokenizer_path, id2label: Dict[int, str], max_length: int = 128):
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
+        self.id2label = {int(k): v for k, v in id2label.items()}
+        self.max_length = max_length
+
+    def encode(self, texts: Sequence[str]):
+        return self.tokenizer(
+            [list(text) for text in texts],
+            is_split_into_words=True,
+            truncation=True,
+            max_length=self.max_length,
+            padding=True,
+            return_tensors="np",
+        )
+
+    def logits(self, encoded) -> np.ndarray:
+        raise NotImplementedError
+
+    def predict(self, texts: Sequence[str], batch_size: int = 32) -> List[List[Dict]]:
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        results: List[List[Dict]] = [[] for _ in texts]
+        for offset in range(0, len(order), batch_size):
+            indexes = order[offset: offset + batch_size]
+            encoded = self.encode([texts[i] for i in indexes])
+            predictions = self.logits(encoded).argmax(axis=-1)
+            for row, i in enumerate(indexes):
+                token_labels = [self.id2label[int(p)] for p in predictions[row]]
+                char_labels = char_labels_from_tokens(texts[i], encoded.word_ids(row), token_labels)
+                results[i] = decode_spans(texts[i], char_labels)
+        return results
+
+
+class NerPredictor(BaseNerPredictor):
+    """PyTorch 后端，CPU 上在 torch.inference_mode 下推理"""
+
+    def __init__(self, model_dir, tokenizer_name=None, max_length: int = 128, num_threads: Optional[int] = None):
+        import torch
+        from transformers import AutoModelForTokenClassification
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.torch = torch
+        self.model = AutoModelForTokenClassification.from_pretrained(model_dir)
+        self.model.eval()
+        # Trainer.save_model 没有保存分词器时，使用训练时的预训练分词器
+        super().__init__(tokenizer_name or model_dir, self.model.config.id2label, max_length)
+
+    def logits(self, encoded) -> np.ndarray:
+        inputs = {key: self.torch.from_numpy(value) for key, value in encoded.items()}
+        with self.torch.inference_mode():
+            return self.model(**inputs).logits.numpy()
+
+
+class OnnxNerPredictor(BaseNerPredictor):
+    """ONNX Runtime 后端 (export_onnx.py 导出的模型，可以是 int8 动态量化版本)，不依赖 torch"""
+
+    def __init__(self, model_path, tokenizer_path=None, max_length: int = 128, num_threads: Optional[int] = None):
+        import onnxruntime
+        from transformers import AutoConfig
+
+        model_path = Path(model_path)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [item.name for item in self.session.get_inputs()]
+        # 导出时模型配置 (id2label) 和分词器与 model.onnx 保存在同一目录
+        model_config = AutoConfig.from_pretrained(model_path.parent)
+        super().__init__(tokenizer_path or model_path.parent, model_config.id2label, max_length)
+
+    def logits(self, encoded) -> np.ndarray:
+        inputs = {name: np.asarray(encoded[name], dtype=np.int64) for name in self.input_names}
+        return self.session.run(["logits"], inputs)[0]
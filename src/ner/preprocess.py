@@ -1,72 +1,146 @@
-from datasets import load_dataset
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+from datasets import load_dataset, load_from_disk
 from transformers import AutoTokenizer
 
 from conf import config
 
+# 预处理逻辑变化时递增，使旧的缓存失效
+PREPROCESS_VERSION = 2
+FINGERPRINT_FILE = "fingerprint.json"
+
+"""
+{
+    B:0,
+    I:1,
+    O:2
+}
+"""
+label2id = {label: id for id, label in enumerate(config.LABELS)}
+B, I, O = label2id["B"], label2id["I"], label2id["O"]
+
+
+def char_labels(length, entities):
+    """
+    根据实体的 start/end 坐标生成逐字符的标签数组
+
+    这是 label 的结构
+    {
+        "start": 3,
+        "end": 7,
+        "text": "德国进口",
+        "labels": ["TAG"]
+    }
+    start，end 是 标签在原始文本的坐标；实体内部为 I，首字符为 B，其余为 O。
+    超出文本范围的坐标截断到 [0, length)，截断后为空 (start >= end) 的实体跳过，两种情况都打印警告。
+    """
+    labels = np.full(length, O, dtype=np.int64)
+    if not entities:
+        return labels
+    starts = np.fromiter((entity["start"] for entity in entities), dtype=np.int64)
+    ends = np.fromiter((entity["end"] for entity in entities), dtype=np.int64)
+    clipped_starts = np.clip(starts, 0, length)
+    clipped_ends = np.clip(ends, 0, length)
+    invalid = (clipped_starts != starts) | (clipped_ends != ends) | (clipped_starts >= clipped_ends)
+    if invalid.any():
+        for i in np.flatnonzero(invalid):
+            action = "截断" if clipped_starts[i] < clipped_ends[i] else "跳过"
+            print(f"警告: 实体 {entities[i].get('text')!r} 的坐标 [{starts[i]}, {ends[i]}) "
+                  f"无效或超出文本长度 {length}，已{action}")
+        keep = clipped_starts < clipped_ends
+        starts, ends = clipped_starts[keep], clipped_ends[keep]
+    # 差分数组: 实体区间 [start, end) 内累加和大于 0
+    delta = np.zeros(length + 1, dtype=np.int64)
+    np.add.at(delta, starts, 1)
+    np.add.at(delta, ends, -1)
+    labels[np.cumsum(delta[:-1]) > 0] = I
+    labels[starts] = B
+    return labels
+
+
+def align_labels(labels, word_ids):
+    """
+    把逐字符标签对齐到 token 上
+
+    文本按字符切分后分词，一个字符不一定恰好对应一个 token: 空白字符不产生 token，
+    截断时尾部字符被丢弃，个别字符会被拆成多个子词。
+    每个字符只在其第一个 token 上计算 loss，特殊 token 和后续子词为 -100。
+    """
+    word_ids = np.array([-1 if word_id is None else word_id for word_id in word_ids], dtype=np.int64)
+    first = np.ones(len(word_ids), dtype=bool)
+    first[1:] = word_ids[1:] != word_ids[:-1]
+    keep = (word_ids >= 0) & first
+    return np.where(keep, labels[np.maximum(word_ids, 0)], -100)
+
+
+def fingerprint(tokenizer):
+    """原始数据、分词器和预处理参数的哈希，任一变化都需要重新处理"""
+    digest = hashlib.sha256()
+    with open(config.RAW_DATA_FILE, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(tokenizer.backend_tokenizer.to_str().encode("utf-8"))
+    digest.update(json.dumps([PREPROCESS_VERSION, config.LABELS, config.SEED]).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def is_cached(key):
+    path = config.PROCESS_DATA_DIR / FINGERPRINT_FILE
+    if not path.exists():
+        return False
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("fingerprint") == key
+
+
+def process(force=False, num_proc=config.PREPROCESS_WORKERS):
+    tokenizer = AutoTokenizer.from_pretrained(config.MODEL_NAME, use_fast=True)
+    key = fingerprint(tokenizer)
+    if not force and is_cached(key):
+        print(f"原始数据和分词器未变化，使用已处理的数据: {config.PROCESS_DATA_DIR}")
+        return load_from_disk(config.PROCESS_DATA_DIR)
 
-def process():
     # 加载数据
     dataset = load_dataset("json", data_files=config.RAW_DATA_FILE)["train"]
     print(dataset)
     dataset = dataset.remove_columns(["id", "annotator", "annotation_id", "created_at", "updated_at", "lead_time"])
 
-    # 先分出 80% 作为训练集，剩下 20% 暂存为 test
-    dataset_dict = dataset.train_test_split(train_size=0.8)
+    # 先分出 80% 作为训练集，剩下 20% 暂存为 test；固定随机种子，相同数据得到相同划分
+    dataset_dict = dataset.train_test_split(train_size=0.8, seed=config.SEED)
     # 再把上一步的 20% 平分成验证/最终测试，各 10%
-    dataset_dict["test"], dataset_dict["valid"] = dataset_dict["test"].train_test_split(test_size=0.5).values()
-
-    tokenizer = AutoTokenizer.from_pretrained(config.MODEL_NAME)
+    dataset_dict["test"], dataset_dict["valid"] = (
+        dataset_dict["test"].train_test_split(test_size=0.5, seed=config.SEED).values()
+    )
 
-    id2label = ["B", "I", "O"]
-    """
-    {
-        B:0,
-        I:1,
-        O:2
-    }
-    """
-    label2id = {label: id for id, label in enumerate(id2label)}
-
-    def map_func(example):
-        """
-        tokens = list(example["text"]) 把字符串逐字符拆成列表。
-        list() 是 Python 内置函数：对可迭代对象（字符串、列表、元组等）生成一个列表。
-        这里 example["text"] 是一句话，list(...) 得到按字符分割的序列，后续按字符做标注/编码。
-        """
-
-        """
-            麦德龙德国进口双心多维叶黄素护眼营养软胶囊30粒x3盒眼干涩
-        """
-        tokens = list(example["text"])
-        inputs = tokenizer(tokens, truncation=True, is_split_into_words=True)
-        # [label2id["O"]] * len(tokens) 生成一个同长度的列表，全是 “O” 对应的编号
-        labels = [label2id["O"]] * len(tokens)
-
-        """
-            这是 label 的结构
-            {
-                "start": 3,
-                "end": 7,
-                "text": "德国进口",
-                "labels": [
-                "TAG"
-                ]
-            }
-            start，end 是 标签在原始文本的坐标
-        """
-
-        for entity in example["label"]:
-            start = entity["start"]
-            end = entity["end"]
-            labels[start:end] = [label2id["B"]] + [label2id["I"]] * (end - start - 1)
-        labels = [-100] + labels + [-100]
-        inputs["labels"] = labels
+    def map_func(batch):
+        # 整批交给 Rust 实现的 fast tokenizer，按字符切分
+        inputs = tokenizer([list(text) for text in batch["text"]], truncation=True, is_split_into_words=True)
+        inputs["labels"] = [
+            align_labels(char_labels(len(text), entities), inputs.word_ids(i)).tolist()
+            for i, (text, entities) in enumerate(zip(batch["text"], batch["label"]))
+        ]
         return inputs
 
-    dataset_dict = dataset_dict.map(map_func, batched=False, remove_columns=["text", "label"])
+    dataset_dict = dataset_dict.map(
+        map_func,
+        batched=True,
+        batch_size=config.PREPROCESS_BATCH_SIZE,
+        num_proc=num_proc if num_proc and num_proc > 1 else None,
+        remove_columns=["text", "label"],
+    )
 
     dataset_dict.save_to_disk(config.PROCESS_DATA_DIR)
+    with open(config.PROCESS_DATA_DIR / FINGERPRINT_FILE, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": key, "model": config.MODEL_NAME}, f)
+    return dataset_dict
 
 
 if __name__ == "__main__":
-    process()
+    parser = argparse.ArgumentParser(description="NER 数据预处理")
+    parser.add_argument("--force", action="store_true", help="忽略缓存，重新处理")
+    parser.add_argument("--workers", type=int, default=min(config.PREPROCESS_WORKERS, os.cpu_count() or 1))
+    args = parser.parse_args()
+    process(force=args.force, num_proc=args.workers)
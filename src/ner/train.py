@@ -1,3 +1,5 @@
+import argparse  # 命令行参数解析
+
 import evaluate  # 导入 evaluate 库，用于加载评估指标（如 seqeval）
 from datasets import load_from_disk  # 从 datasets 库导入 load_from_disk，用于加载本地保存的数据集
 from transformers import (  # 从 transformers 库导入所需的类
@@ -5,11 +7,17 @@ from transformers import (  # 从 transformers 库导入所需的类
     AutoTokenizer,  # 自动分词器类
     DataCollatorForTokenClassification,  # 用于 Token 分类任务的数据整理器（处理 padding 等）
     EvalPrediction,  # 评估预测结果的数据结构
-    Trainer,  # Hugging Face 的训练器，封装了训练循环
     TrainingArguments,  # 训练参数配置类
 )
 
 from conf import config  # 导入本地配置文件，包含路径、超参数等常量
+from ner.batching import BATCHING_MODES, BucketTrainer, PaddingStats  # 按长度分组 / token 预算分批
+
+# 命令行参数：分批方式与 token 预算，默认取配置
+parser = argparse.ArgumentParser(description="训练 NER 模型")
+parser.add_argument("--batching", choices=BATCHING_MODES, default=config.BATCHING, help="分批方式")
+parser.add_argument("--max-tokens", type=int, default=config.MAX_TOKENS_PER_BATCH, help="tokens 分批时每批最大 token 数")
+args = parser.parse_args()
 
 # label映射关系
 
@@ -64,7 +72,8 @@ def compute_metrics(prediction: EvalPrediction) -> dict:  # 定义计算评估
 # 初始化分词器，使用与模型相同的预训练名称
 tokenizer = AutoTokenizer.from_pretrained(config.MODEL_NAME)
 # 初始化数据整理器，用于将 batch 数据动态 padding 到最大长度，并转换为 PyTorch 张量
-data_collator = DataCollatorForTokenClassification(tokenizer=tokenizer, padding=True, return_tensors="pt")
+# 外面包一层 PaddingStats，统计真实 token 占比（padding 效率）
+data_collator = PaddingStats(DataCollatorForTokenClassification(tokenizer=tokenizer, padding=True, return_tensors="pt"))
 
 # 定义训练参数
 training_args = TrainingArguments(
@@ -84,16 +93,21 @@ training_args = TrainingArguments(
 )
 
 # 初始化 Trainer
-trainer = Trainer(
+trainer = BucketTrainer(
     model=model,  # 待训练的模型
     args=training_args,  # 训练参数
     data_collator=data_collator,  # 数据整理器
     train_dataset=train_dataset,  # 训练数据集
     eval_dataset=valid_dataset,  # 验证数据集
     compute_metrics=compute_metrics,  # 评估指标计算函数
+    batching=args.batching,  # 分批方式：random / length / tokens
+    max_tokens=args.max_tokens,  # tokens 模式下每批 padding 后的最大 token 数
 )
 
 # 开始训练
-trainer.train()
+train_result = trainer.train()
+# 打印吞吐与 padding 效率（统计包含训练和训练过程中的验证批次）
+print(f"分批方式: {args.batching}，训练速度: {train_result.metrics['train_samples_per_second']:.2f} 条/秒")
+print("padding 统计", data_collator.summary())
 # 保存最终的最佳模型到指定目录
 trainer.save_model(config.CHECKPOINT_DIR / "ner" / "best_model")
@@ -0,0 +1,79 @@
+import re
+from typing import List, Optional, Tuple
+
+from neo4j import AsyncDriver, RoutingControl
+
+# Lucene 查询语法中的特殊字符，用户输入的实体名需要转义后才能交给全文索引
+_LUCENE_SPECIAL_CHARS = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/])')
+
+# 一次查询完成一个标签下所有实体的混合检索:
+# 向量索引与全文索引各取 top-k，分数分别按各自最大值归一化后合并 (与 Neo4jVector 的 HYBRID 一致)，
+# 每个实体保留得分最高的节点
+HYBRID_ALIGN_QUERY = """
+UNWIND $rows AS row
+CALL {
+    WITH row
+    CALL {
+        WITH row
+        CALL db.index.vector.queryNodes($index_name, $k, row.embedding) YIELD node, score
+        WITH collect({node: node, score: score}) AS hits, max(score) AS top
+        UNWIND hits AS hit
+        RETURN hit.node AS node, hit.score / top AS score
+        UNION
+        WITH row
+        CALL db.index.fulltext.queryNodes($keyword_index_name, row.query, {limit: $k}) YIELD node, score
+        WITH collect({node: node, score: score}) AS hits, max(score) AS top
+        UNWIND hits AS hit
+        RETURN hit.node AS node, hit.score / top AS score
+    }
+    WITH node, max(score) AS score
+    ORDER BY score DESC
+    LIMIT 1
+    RETURN node.name AS name, score
+}
+RETURN row.index AS index, name, score
+"""
+
+
+def escape_lucene(text: str) -> str:
+    return _LUCENE_SPECIAL_CHARS.sub(r"\\\1", text)
+
+
+class Neo4jHybridAligner:
+    """基于 Neo4j 向量索引 + 全文索引的实体对齐，一个标签的所有实体只需一次往返"""
+
+    engine = "neo4j"
+
+    def __init__(self, driver: AsyncDriver, index_name: str, keyword_index_name: str, k: int = 1,
+                 database: Optional[str] = None):
+        self.driver = driver
+        self.database = database
+        self.index_name = index_name
+        self.keyword_index_name = keyword_index_name
+        self.k = k
+
+    async def search(self, texts: List[str], vectors: List[List[float]]) -> List[Optional[Tuple[str, float]]]:
+        """
+        Args:
+            texts: 待对齐的实体原文
+            vectors: 与 texts 一一对应的 embedding
+        Returns:
+            与 texts 一一对应的 (规范名称, 分数)，没有检索到时为 None
+        """
+        rows = [
+            {"index": i, "query": escape_lucene(text), "embedding": vector}
+            for i, (text, vector) in enumerate(zip(texts, vectors))
+        ]
+        records, _, _ = await self.driver.execute_query(
+            HYBRID_ALIGN_QUERY,
+            rows=rows,
+            index_name=self.index_name,
+            keyword_index_name=self.keyword_index_name,
+            k=self.k,
+            routing_=RoutingControl.READ,
+            database_=self.database,
+        )
+        results: List[Optional[Tuple[str, float]]] = [None] * len(texts)
+        for record in records:
+            results[record["index"]] = (record["name"], record["score"])
+        return results
@@ -0,0 +1,353 @@
+import copy
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+class LRUCache:
+    """带 TTL 的 LRU 缓存，容量满时淘汰最久未使用的条目"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def normalize_surface(text: str) -> str:
+    """实体原文归一化：全角转半角、小写、去除多余空白"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class AlignmentCache:
+    """
+    实体对齐结果缓存: (label, 归一化的实体原文) → (规范名称, 分数)
+
+    每个标签一个独立的 LRU 命名空间，SPU 等大词表的淘汰不会挤掉分类、品牌的缓存，
+    datasync 改写某个标签后也只需清空该标签的命名空间。
+    """
+
+    def __init__(self, max_size_per_label: int, ttl: float):
+        self.max_size_per_label = max_size_per_label
+        self.ttl = ttl
+        self._namespaces: Dict[str, LRUCache] = {}
+
+    def _namespace(self, label: str) -> LRUCache:
+        if label not in self._namespaces:
+            self._namespaces[label] = LRUCache(self.max_size_per_label, self.ttl)
+        return self._namespaces[label]
+
+    def get(self, label: str, entity: str) -> Optional[Tuple[str, float]]:
+        return self._namespace(label).get(normalize_surface(entity))
+
+    def set(self, label: str, entity: str, result: Tuple[str, float]):
+        self._namespace(label).set(normalize_surface(entity), result)
+
+    def purge(self, labels: Optional[Iterable[str]] = None):
+        """清空指定标签的缓存，labels 为 None 时全部清空；可直接作为 GraphChangeWatcher 的回调"""
+        if labels is None:
+            labels = list(self._namespaces)
+        for label in labels:
+            if label in self._namespaces:
+                self._namespaces[label].clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {label: cache.stats() for label, cache in self._namespaces.items()}
+
+
+class SemanticCypherCache:
+    """
+    问题 → 参数化 Cypher 的语义缓存
+
+    以问题的 embedding (已归一化，内积即余弦相似度) 作为键，缓存 LLM 生成的
+    cypher_query 和 entities_to_align。向量相似度只用来找候选，命中还要求:
+    1. 缓存中的每个实体原文都出现在新问题里，且出现次数相同——
+       “华为手机有哪些” 与 “小米手机有哪些” 向量很接近，但实体不同，不能复用；
+    2. 把实体原文替换成参数名后的问题模板与缓存的模板相同，或相似度超过 exact_threshold——
+       “华为最贵的手机” 与 “华为最便宜的手机”、“价格低于3000” 与 “价格低于5000”
+       实体相同但查询条件不同，多出一个品牌/分类的问题模板也不同，都不能复用。
+
+    淘汰策略: 容量满时淘汰最久未使用的条目 (LRU)，条目超过 ttl 秒后失效；
+    schema version 变化时整体清空。
+    """
+
+    def __init__(self, threshold: float, max_size: int, ttl: float, exact_threshold: float = 0.98):
+        self.threshold = threshold
+        self.exact_threshold = exact_threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self.schema_version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_key = 0
+        # 所有缓存向量堆叠成的矩阵，条目变化后惰性重建
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[int] = []
+
+    def lookup(self, vector: List[float], question: str, schema_version: str) -> Optional[Dict[str, Any]]:
+        self._check_schema(schema_version)
+        self._expire()
+        if not self._entries:
+            self.misses += 1
+            return None
+
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries)
+            self._matrix = np.stack([self._entries[key]["vector"] for key in self._matrix_keys])
+        scores = self._matrix @ np.asarray(vector, dtype=np.float32)
+
+        # 按相似度从高到低找第一条实体能对上的缓存
+        for index in np.argsort(-scores):
+            if scores[index] < self.threshold:
+                break
+            key = self._matrix_keys[index]
+            entry = self._entries[key]
+            if self._matches(entry, question, float(scores[index])):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                # 实体对齐会原地修改 entities_to_align，返回副本
+                return copy.deepcopy(entry["value"])
+        self.misses += 1
+        return None
+
+    @staticmethod
+    def _surfaces(entities: List[Dict[str, Any]]) -> Dict[str, str]:
+        return {
+            node.get("param_name") or f"param_{i}": normalize_surface(node["entity"])
+            for i, node in enumerate(entities)
+        }
+
+    def _matches(self, entry: Dict[str, Any], question: str, score: float) -> bool:
+        question = normalize_surface(question)
+        surfaces = entry["surfaces"]
+        if any(not surface or question.count(surface) != entry["counts"][surface] for surface in surfaces.values()):
+            return False
+        return question_template(question, surfaces) == entry["template"] or score >= self.exact_threshold
+
+    def store(self, vector: List[float], question: str, value: Dict[str, Any], schema_version: str) -> bool:
+        """缓存 LLM 的结果；entities_to_align 中有缺少 entity 的条目时不缓存，返回 False"""
+        entities = value.get("entities_to_align")
+        if not isinstance(entities, list) or not all(
+            isinstance(node, dict) and isinstance(node.get("entity"), str) for node in entities
+        ):
+            return False
+        self._check_schema(schema_version)
+        question = normalize_surface(question)
+        surfaces = self._surfaces(entities)
+        self._entries[self._next_key] = {
+            "vector": np.asarray(vector, dtype=np.float32),
+            "surfaces": surfaces,
+            "counts": {surface: question.count(surface) for surface in surfaces.values()},
+            "template": question_template(question, surfaces),
+            "value": copy.deepcopy(value),
+            "created_at": time.monotonic(),
+        }
+        self._next_key += 1
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self._matrix = None
+        return True
+
+    def clear(self):
+        self._entries.clear()
+        self._matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def _check_schema(self, schema_version: str):
+        if schema_version != self.schema_version:
+            self.clear()
+            self.schema_version = schema_version
+
+    def _expire(self):
+        deadline = time.monotonic() - self.ttl
+        expired = [key for key, entry in self._entries.items() if entry["created_at"] < deadline]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+
+# Cypher 中的节点模式: (n)、(n:Label)、(:A:B {...})、(n:Label WHERE ...)；
+# 前面紧跟标识符的是函数调用 (count(n))，括号内不是变量/标签的是表达式，都不算节点
+_NODE_PATTERN = re.compile(r"(?<!\w)\(\s*\w*\s*((?::\s*`?\w+`?\s*)*)(?=[{)]|WHERE\b)", re.IGNORECASE)
+_LABEL_NAME_PATTERN = re.compile(r"\w+")
+# 含有未标注标签的节点 (如 MATCH (s:SPU)-->(c) 中的 c) 的查询归入该分组，任何标签变化都会使其失效
+ANY_LABEL = "*"
+
+
+def question_template(question: str, surfaces: Dict[str, str]) -> str:
+    """把问题中的实体原文替换成参数名 (“华威手机有哪些” → “{param_0}手机有哪些”)，长的实体先替换"""
+    template = question
+    for param_name, surface in sorted(surfaces.items(), key=lambda item: -len(item[1] or "")):
+        if surface:
+            template = template.replace(surface, "{" + param_name + "}")
+    return template
+
+
+def canonical_json(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class QueryResultCache:
+    """
+    Cypher 查询结果缓存
+
+    键为归一化的 Cypher 文本 (合并空白) + 规范化的参数 (按键排序的 JSON)。
+    按结果序列化后的大小计入内存预算，超出预算时按 LRU 淘汰，条目超过 ttl 秒失效。
+    每条缓存记录查询涉及的节点标签，datasync 改写某个标签后只清除相关的条目；
+    模式中有未标注标签的节点时，该条目任何标签变化都会清除。
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._keys_by_label: Dict[str, Set[str]] = {}
+
+    @staticmethod
+    def make_key(cypher: str, params: Dict[str, Any]) -> str:
+        normalized = " ".join(cypher.split()).rstrip(";")
+        return normalized + "\n" + canonical_json(params)
+
+    @staticmethod
+    def labels_of(cypher: str) -> Set[str]:
+        """查询涉及的节点标签；有节点没有标签 (可能匹配任意标签) 或识别不出节点时包含 ANY_LABEL"""
+        labels: Set[str] = set()
+        unlabeled = False
+        for match in _NODE_PATTERN.finditer(cypher):
+            names = _LABEL_NAME_PATTERN.findall(match.group(1))
+            labels.update(names)
+            unlabeled = unlabeled or not names
+        if unlabeled or not labels:
+            labels.add(ANY_LABEL)
+        return labels
+
+    def get(self, cypher: str, params: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        key = self.make_key(cypher, params)
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry["created_at"] > self.ttl:
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry["result"]
+
+    def set(self, cypher: str, params: Dict[str, Any], result: List[Dict[str, Any]]):
+        key = self.make_key(cypher, params)
+        size = len(key.encode("utf-8")) + len(canonical_json(result).encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        labels = self.labels_of(cypher)
+        self._entries[key] = {"created_at": time.monotonic(), "size": size, "labels": labels, "result": result}
+        self.bytes += size
+        for label in labels:
+            self._keys_by_label.setdefault(label, set()).add(key)
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, labels: Optional[Iterable[str]] = None):
+        """清除涉及指定标签的结果，labels 为 None 时全部清除；可直接作为 GraphChangeWatcher 的回调"""
+        if labels is None:
+            self._entries.clear()
+            self._keys_by_label.clear()
+            self.bytes = 0
+            return
+        keys = set(self._keys_by_label.get(ANY_LABEL, ()))
+        for label in labels:
+            keys.update(self._keys_by_label.get(label, ()))
+        for key in keys:
+            self._remove(key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= entry["size"]
+        for label in entry["labels"]:
+            keys = self._keys_by_label.get(label)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_label[label]
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def answer_cache_key(question: str, surfaces: Dict[str, str], params: Dict[str, Any],
+                     query_result: List[Dict[str, Any]]) -> str:
+    """
+    最终答案缓存的键: 问题模板 + 参数 + 查询结果
+
+    问题模板是把实体原文替换成参数名后的问题 (“华威手机有哪些” → “{param_0}手机有哪些”)，
+    对齐到同一实体、查询结果也相同的问题可以复用同一个回答。
+    """
+    payload = canonical_json({
+        "template": question_template(question, surfaces),
+        "params": params,
+        "result": query_result,
+    })
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
@@ -1,12 +1,20 @@
+import json
+import time
+
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import RedirectResponse
+from starlette.responses import JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
 from starlette.staticfiles import StaticFiles
 
 from src.web.schemas import Question, Answer
 from src.web.service import ChatService
+from src.common.graph_db import Neo4jConnections
+from src.common.metrics import CONTENT_TYPE, registry
+from src.web import metrics
 from src.web.monitor import manager
+from src.web.startup import Startup
+from src.web.tracing import tracer
 from src.conf import config
 from fastapi import WebSocket, WebSocketDisconnect
 
@@ -19,7 +27,40 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-service = ChatService()
+# 进程内共享的 Neo4j 连接池
+neo4j = Neo4jConnections(config.NEO4J_CONFIG)
+service = ChatService(neo4j)
+# 依赖在后台并发启动和预热，uvicorn 可以立即接受请求
+startup = Startup()
+for name, factory in service.warmup_tasks().items():
+    startup.add(name, factory, **service.WARMUP_OPTIONS.get(name, {}))
+tracer.add_listener(metrics.observe_span)
+metrics.register_collectors(service, manager)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # 使用路由模板作为标签，避免静态文件等路径导致标签基数膨胀
+    route = request.scope.get("route")
+    path = getattr(route, "path", "other")
+    metrics.HTTP_REQUESTS.labels(path, request.method, response.status_code).inc()
+    # 流式接口在这里只统计到响应头发出，完整耗时见 graphrag_chat_span_duration_seconds
+    metrics.HTTP_LATENCY.labels(path).observe(time.perf_counter() - start)
+    return response
+
+
+@app.on_event("startup")
+async def on_startup():
+    startup.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await startup.stop()
+    await service.close()
+    await neo4j.aclose()
 
 
 @app.get("/")
@@ -35,6 +76,59 @@ async def read_item(question: Question) -> Answer:
     return Answer(message=answer)
 
 
+@app.post("/api/chat/stream")
+async def chat_stream(question: Question):
+    """
+    流式问答 (Server-Sent Events)
+
+    每个阶段完成后发送一个事件，最终答案按 token 以 answer_token 事件发送，
+    最后一个事件为 workflow_end。不支持流式的客户端使用 /api/chat。
+    """
+
+    async def event_source():
+        try:
+            async for event in service.chat_stream(question.message):
+                data = json.dumps(event["data"], ensure_ascii=False, default=str)
+                yield f"event: {event['type']}\ndata: {data}\n\n"
+        except Exception as e:
+            # 响应头已经发出，只能通过事件告知客户端失败
+            print(f"流式问答出错: {e}")
+            data = json.dumps({"message": str(e)}, ensure_ascii=False)
+            yield f"event: error\ndata: {data}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        # 禁止反向代理缓冲，保证事件实时到达浏览器
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/traces")
+async def traces(limit: int = 20):
+    """最近的请求追踪记录，以及各步骤耗时的 p50/p95/p99 (毫秒)"""
+    return {"traces": tracer.recent(limit), "summary": tracer.summary()}
+
+
+@app.get("/healthz")
+def healthz():
+    """存活检查：进程能响应即可"""
+    return {"status": "ok"}
+
+
+# /readyz、/metrics 读取事件循环中同时被修改的缓存、监控连接等结构，且不阻塞，
+# 必须定义为 async，在事件循环中执行而不是被 FastAPI 放到线程池
+@app.get("/readyz")
+async def readyz():
+    """就绪检查：Neo4j、embedding 模型、schema 都已就绪才返回 200"""
+    return JSONResponse(startup.status(), status_code=200 if startup.ready else 503)
+
+
+@app.get("/metrics")
+async def read_metrics():
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+
 @app.websocket("/ws/monitor")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
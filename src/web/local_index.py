@@ -0,0 +1,170 @@
+import asyncio
+import json
+import math
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+VECTORS_FILE = "vectors.npy"
+NAMES_FILE = "names.json"
+META_FILE = "meta.json"
+
+
+def _ngrams(text: str, sizes=(1, 2)) -> set:
+    text = text.lower()
+    return {text[i: i + n] for n in sizes for i in range(len(text) - n + 1)}
+
+
+class KeywordScorer:
+    """
+    字符 n-gram + BM25 的关键词打分，近似 Neo4j 全文索引的效果
+
+    Neo4j 全文索引的标准分词器会把中文切成单字，这里额外加入双字 gram，
+    让“华为”这种连续匹配的得分高于分散匹配。
+    """
+
+    def __init__(self, names: List[str], k1: float = 1.2, b: float = 0.75):
+        postings = defaultdict(list)
+        lengths = np.zeros(len(names), dtype=np.float32)
+        for doc_id, name in enumerate(names):
+            grams = _ngrams(name)
+            lengths[doc_id] = max(len(grams), 1)
+            for gram in grams:
+                postings[gram].append(doc_id)
+        self.size = len(names)
+        self.postings = {gram: np.asarray(ids, dtype=np.int64) for gram, ids in postings.items()}
+        self.idf = {
+            gram: math.log(1 + (self.size - len(ids) + 0.5) / (len(ids) + 0.5))
+            for gram, ids in self.postings.items()
+        }
+        # 每个文档命中一个 gram 时的 BM25 词频因子 (tf 恒为 1)
+        avg_length = float(lengths.mean()) if self.size else 1.0
+        self.tf_weight = (k1 + 1) / (1 + k1 * (1 - b + b * lengths / avg_length))
+
+    def search(self, text: str, k: int) -> List[Tuple[int, float]]:
+        scores = np.zeros(self.size, dtype=np.float32)
+        for gram in _ngrams(text):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                scores[ids] += self.idf[gram] * self.tf_weight[ids]
+        return _top_k(scores, k)
+
+
+def _top_k(scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    if not len(scores):
+        return []
+    k = min(k, len(scores))
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    candidates = candidates[np.argsort(-scores[candidates])]
+    return [(int(i), float(scores[i])) for i in candidates if scores[i] > 0]
+
+
+class LocalHybridAligner:
+    """
+    本地内存中的实体对齐引擎，接口与 Neo4jHybridAligner 一致
+
+    启动时以内存映射方式加载快照: 名称列表 + 归一化后的 float32 向量矩阵，
+    向量检索是一次矩阵乘法，关键词检索由 KeywordScorer 完成，
+    两路结果按各自最大值归一化后取最大值合并，与 Neo4j 的 HYBRID 检索一致。
+    适合分类、品牌等小词表，省去每次对齐的网络往返。
+    """
+
+    engine = "local"
+
+    def __init__(self, names: List[str], vectors: np.ndarray, k: int = 1, executor: Optional[Executor] = None):
+        self.names = names
+        self.vectors = vectors
+        self.k = k
+        self.executor = executor
+        self.keyword_scorer = KeywordScorer(names)
+
+    @staticmethod
+    def snapshot_exists(directory: Path) -> bool:
+        return all((Path(directory) / name).exists() for name in (VECTORS_FILE, NAMES_FILE))
+
+    @classmethod
+    def load(cls, directory: Path, **kwargs) -> "LocalHybridAligner":
+        directory = Path(directory)
+        with open(directory / NAMES_FILE, encoding="utf-8") as f:
+            names = json.load(f)
+        vectors = np.load(directory / VECTORS_FILE, mmap_mode="r")
+        return cls(names, vectors, **kwargs)
+
+    async def search(self, texts: List[str], vectors: List[List[float]]) -> List[Optional[Tuple[str, float]]]:
+        if self.executor is None:
+            return self._search(texts, vectors)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._search, texts, vectors)
+
+    def _search(self, texts: List[str], vectors: List[List[float]]) -> List[Optional[Tuple[str, float]]]:
+        if not self.names:
+            return [None] * len(texts)
+        queries = np.asarray(vectors, dtype=np.float32)
+        # 向量已归一化，内积即余弦相似度；(N, dim) @ (dim, Q) 一次算完所有实体
+        similarities = np.asarray(self.vectors @ queries.T)
+
+        results = []
+        for column, text in enumerate(texts):
+            merged: Dict[int, float] = {}
+            for hits in (_top_k(similarities[:, column], self.k), self.keyword_scorer.search(text, self.k)):
+                if not hits:
+                    continue
+                top = hits[0][1]
+                for doc_id, score in hits:
+                    merged[doc_id] = max(merged.get(doc_id, 0.0), score / top)
+            if merged:
+                doc_id = max(merged, key=merged.get)
+                results.append((self.names[doc_id], merged[doc_id]))
+            else:
+                results.append(None)
+        return results
+
+
+def export_snapshot(driver, label: str, directory: Path, name_property="name", embedding_property="embedding",
+                    database=None):
+    """
+    从 Neo4j 导出某个标签的名称和 embedding，生成 LocalHybridAligner 使用的快照
+
+    Args:
+        driver: neo4j 同步 driver
+        label: 节点标签
+        directory: 快照目录
+        database: Neo4j 数据库名，None 为默认数据库
+    """
+    records, _, _ = driver.execute_query(
+        f"""
+        MATCH (n:`{label}`)
+        WHERE n.{name_property} IS NOT NULL AND n.{embedding_property} IS NOT NULL
+        RETURN n.{name_property} AS name, n.{embedding_property} AS embedding
+        """,
+        database_=database,
+    )
+    names = [record["name"] for record in records]
+    if not names:
+        print(f"{label} 没有可导出的 embedding，跳过快照导出")
+        return
+    vectors = np.asarray([record["embedding"] for record in records], dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    # 先写临时文件再原子替换，服务端重新加载时不会读到写了一半的快照
+    with open(directory / (VECTORS_FILE + ".tmp"), "wb") as f:
+        np.save(f, np.ascontiguousarray(vectors))
+    with open(directory / (NAMES_FILE + ".tmp"), "w", encoding="utf-8") as f:
+        json.dump(names, f, ensure_ascii=False)
+    os.replace(directory / (VECTORS_FILE + ".tmp"), directory / VECTORS_FILE)
+    os.replace(directory / (NAMES_FILE + ".tmp"), directory / NAMES_FILE)
+    with open(directory / META_FILE, "w", encoding="utf-8") as f:
+        json.dump({
+            "label": label,
+            "count": len(names),
+            "dimensions": int(vectors.shape[1]),
+            "created_at": time.time(),
+        }, f)
+    print(f"已导出 {label} 的对齐快照: {len(names)} 个节点 -> {directory}")
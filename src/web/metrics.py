@@ -0,0 +1,84 @@
+from typing import Any, Dict
+
+from src.common.metrics import registry
+
+HTTP_REQUESTS = registry.counter(
+    "graphrag_http_requests_total", "HTTP requests by route and status", ["path", "method", "status"]
+)
+HTTP_LATENCY = registry.histogram(
+    "graphrag_http_request_duration_seconds", "HTTP request latency by route", ["path"]
+)
+SPAN_LATENCY = registry.histogram(
+    "graphrag_chat_span_duration_seconds", "ChatService step and sub-operation latency", ["span"]
+)
+SPAN_ERRORS = registry.counter(
+    "graphrag_chat_span_errors_total", "ChatService spans that raised", ["span"]
+)
+LLM_CALLS = registry.counter("graphrag_llm_calls_total", "LLM calls", ["purpose"])
+LLM_LATENCY = registry.histogram("graphrag_llm_call_duration_seconds", "LLM call latency", ["purpose"])
+LLM_TOKENS = registry.counter("graphrag_llm_tokens_total", "LLM tokens", ["purpose", "kind"])
+NEO4J_LATENCY = registry.histogram(
+    "graphrag_neo4j_query_duration_seconds", "Neo4j query latency", ["operation"]
+)
+
+
+def observe_span(span: Dict[str, Any]):
+    """Tracer 回调：把 span 转换为指标"""
+    name = span["name"]
+    attributes = span["attributes"]
+    seconds = span["duration_ms"] / 1000
+    SPAN_LATENCY.labels(name).observe(seconds)
+    if "error" in span:
+        SPAN_ERRORS.labels(name).inc()
+
+    # LLM span 按用途命名 (llm.cypher / llm.answer)，两类调用的耗时分布差别很大，分开统计
+    if name.startswith("llm."):
+        purpose = attributes.get("purpose", "unknown")
+        LLM_CALLS.labels(purpose).inc()
+        LLM_LATENCY.labels(purpose).observe(seconds)
+        for kind in ("input_tokens", "output_tokens"):
+            if attributes.get(kind):
+                LLM_TOKENS.labels(purpose, kind).inc(attributes[kind])
+    elif name == "execute_cypher":
+        NEO4J_LATENCY.labels("execute_cypher").observe(seconds)
+    elif name == "similarity_search" and attributes.get("engine") == "neo4j":
+        NEO4J_LATENCY.labels("entity_align").observe(seconds)
+    elif name == "schema_refresh":
+        NEO4J_LATENCY.labels("schema_refresh").observe(seconds)
+
+
+def register_collectors(service, manager):
+    """注册抓取时读取的统计：缓存命中情况、监控面板连接"""
+
+    def collect():
+        cache_stats = {
+            "cypher": service.cypher_cache.stats(),
+            "result": service.result_cache.stats(),
+            "answer": service.answer_cache.stats(),
+            "embedding": service.embedding_store.stats(),
+        }
+        for label, stats in service.alignment_cache.stats().items():
+            cache_stats[f"alignment:{label}"] = stats
+        yield (
+            "graphrag_cache_requests_total", "counter", "Cache lookups by cache and result",
+            [
+                ({"cache": name, "result": result}, stats[key])
+                for name, stats in cache_stats.items()
+                for result, key in (("hit", "hits"), ("miss", "misses"))
+            ],
+        )
+        yield (
+            "graphrag_cache_entries", "gauge", "Entries currently held by each cache",
+            [({"cache": name}, stats["size"]) for name, stats in cache_stats.items()],
+        )
+        monitor_stats = manager.stats()
+        yield (
+            "graphrag_monitor_clients", "gauge", "Connected monitor websocket clients",
+            [({}, monitor_stats["clients"])],
+        )
+        yield (
+            "graphrag_monitor_dropped_events_total", "counter", "Monitor events dropped for lagging clients",
+            [({}, monitor_stats["dropped"])],
+        )
+
+    registry.add_collector(collect)
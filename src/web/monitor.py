@@ -1,50 +1,137 @@
 import asyncio
 import json
-from typing import List, Dict, Any
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
 from fastapi import WebSocket
 
+# 待分发事件的最大积压数，超出后丢弃最旧的事件
+EVENT_BUFFER_SIZE = 1000
+# 每个客户端发送队列的长度，客户端跟不上时丢弃最旧的事件
+CLIENT_QUEUE_SIZE = 256
+
+
+class MonitorClient:
+    """一个监控面板连接：独立的有界发送队列 + 独立的写协程"""
+
+    def __init__(self, websocket: WebSocket, queue_size: int = CLIENT_QUEUE_SIZE):
+        self.websocket = websocket
+        self.queue: Deque[str] = deque(maxlen=queue_size)
+        self.dropped = 0
+        self._ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def offer(self, text: str):
+        """放入发送队列，队列满时 deque 会自动挤掉最旧的一条"""
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(text)
+        self._ready.set()
+
+    async def run(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self.queue:
+                await self.websocket.send_text(self.queue.popleft())
+
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    """
+    监控事件的扇出分发
+
+    broadcast() 只把序列化后的事件放入一个有界缓冲区，耗时与连接数无关
+    (在调用时序列化，避免事件数据在发送前被调用方修改)；
+    后台分发协程负责把事件投递到各客户端的队列，
+    每个客户端由自己的写协程发送，慢客户端只会丢失自己的旧事件，不会拖慢问答请求，
+    发送失败的连接会被自动移除。
+    """
+
+    def __init__(self, buffer_size: int = EVENT_BUFFER_SIZE):
+        self.clients: Dict[WebSocket, MonitorClient] = {}
+        self.dropped = 0
+        self._events: Deque[str] = deque(maxlen=buffer_size)
+        self._pending: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        client = MonitorClient(websocket)
+        client.task = asyncio.create_task(self._write(client))
+        self.clients[websocket] = client
+        if self._dispatcher is None or self._dispatcher.done():
+            self._pending = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        self.dropped += client.dropped
+        if client.task is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
 
-    async def broadcast(self, message: Dict[str, Any]):
-        """Broadcast a JSON message to all connected clients."""
-        if not self.active_connections:
+    def broadcast(self, message: Dict[str, Any]):
+        """Queue a message for all connected clients without waiting on any socket."""
+        if not self.clients:
             return
-            
-        text_data = json.dumps(message, default=str)
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(text_data)
-            except Exception as e:
-                print(f"Error sending to websocket: {e}")
-                # We might want to remove dead connections here, but for now let's keep it simple
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(json.dumps(message, default=str))
+        self._pending.set()
+
+    async def _dispatch(self):
+        while True:
+            await self._pending.wait()
+            self._pending.clear()
+            while self._events:
+                text_data = self._events.popleft()
+                for client in list(self.clients.values()):
+                    client.offer(text_data)
+
+    async def _write(self, client: MonitorClient):
+        try:
+            await client.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error sending to websocket, dropping connection: {e}")
+            self.disconnect(client.websocket)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self.clients),
+            "dropped": self.dropped + sum(client.dropped for client in self.clients.values()),
+        }
+
 
 # Global instance
 manager = ConnectionManager()
 
-async def emit_event(event_type: str, data: Dict[str, Any] = None):
+
+def emit_event(event_type: str, data: Dict[str, Any] = None):
     """
     Helper function to emit an event to the monitoring dashboard.
-    
+
+    Fire-and-forget: the event is queued and delivered by background tasks,
+    so callers on the request path never wait for websocket I/O.
+
     Args:
         event_type: The type of event (e.g., 'workflow_start', 'step_start', 'log')
         data: Additional data associated with the event
     """
     if data is None:
         data = {}
-        
+
     event = {
         "type": event_type,
-        "timestamp": asyncio.get_event_loop().time(), # Simple timestamp
+        "timestamp": time.time(),
         "data": data
     }
-    
-    await manager.broadcast(event)
+
+    manager.broadcast(event)
@@ -0,0 +1,111 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from src.web.tracing import tracer
+
+
+class NerService:
+    """
+    进程内的实体识别服务，对并发请求做微批处理
+
+    extract() 把文本放入队列；后台批处理协程收集到 max_batch_size 条，
+    或者等待最早一条超过 max_latency_ms 后，一次前向计算处理整批 (批内按长度分组)。
+    推理在单独的单线程池中执行 (torch 自己使用多线程)，不阻塞事件循环。
+    模型目录不存在时服务不可用，extract() 返回空结果，问答流程照常进行。
+    """
+
+    def __init__(self, model_dir, tokenizer_name=None, max_batch_size: int = 32, max_latency_ms: float = 5,
+                 max_length: int = 128, backend: str = "torch"):
+        # backend="onnx" 时 model_dir 为 ONNX 模型文件 (同目录下有配置和分词器)
+        self.model_dir = model_dir
+        self.backend = backend
+        self.tokenizer_name = tokenizer_name
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.max_length = max_length
+        self.predictor = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ner")
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+
+    @property
+    def available(self) -> bool:
+        return self.predictor is not None
+
+    def _build_predictor(self):
+        # 延迟导入: torch / onnxruntime / transformers 只在真正加载模型时才导入
+        from src.ner.inference import NerPredictor, OnnxNerPredictor
+
+        if self.backend == "onnx":
+            predictor = OnnxNerPredictor(self.model_dir, max_length=self.max_length)
+        else:
+            predictor = NerPredictor(self.model_dir, self.tokenizer_name, max_length=self.max_length)
+        predictor.predict(["预热"])
+        return predictor
+
+    async def load(self):
+        if self.predictor is not None:
+            return
+        if not os.path.exists(self.model_dir):
+            print(f"NER 模型不存在 ({self.model_dir})，跳过实体识别")
+            return
+        loop = asyncio.get_running_loop()
+        self.predictor = await loop.run_in_executor(self.executor, self._build_predictor)
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._run_batches())
+
+    async def extract(self, texts: List[str]) -> List[List[Dict]]:
+        """返回每条文本的实体片段 [{"start", "end", "text"}]"""
+        if not self.available or not texts:
+            return [[] for _ in texts]
+        loop = asyncio.get_running_loop()
+        with tracer.span("ner", count=len(texts)):
+            futures = []
+            for text in texts:
+                future = loop.create_future()
+                self._queue.put_nowait((text, future))
+                futures.append(future)
+            return list(await asyncio.gather(*futures))
+
+    async def _next_batch(self) -> List[Tuple[str, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            texts = [text for text, _ in batch]
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, self.predictor.predict, texts, self.max_batch_size
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), spans in zip(batch, results):
+                if not future.done():
+                    future.set_result(spans)
+
+    async def close(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+            await asyncio.gather(self._batcher, return_exceptions=True)
+        self.executor.shutdown(wait=False)
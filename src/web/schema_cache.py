@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import time
+from typing import Dict, List, Optional, Set
+
+from neo4j import AsyncDriver, RoutingControl
+
+from src.web.tracing import tracer
+
+# 不进入 Prompt 的属性 (向量等体积大且对生成 Cypher 无帮助)
+HIDDEN_PROPERTY_PREFIXES = ("embedding",)
+
+
+class SchemaCache:
+    """
+    Neo4j 图谱 schema 缓存
+
+    启动时计算一次精简的、可直接拼进 Prompt 的 schema 文本，之后按 TTL 刷新，
+    或在收到图变更信号 (invalidate) 后的下一次访问时刷新。
+    version 是 schema 文本的哈希，下游缓存 (如问题→Cypher 缓存) 以它作为失效依据。
+
+    输出示例:
+        节点:
+        Category1 {id: INTEGER, name: STRING}
+        关系:
+        (:Category2)-[:Belong]->(:Category1)
+    """
+
+    def __init__(self, driver: AsyncDriver, ttl: float, sample_size: int = 1000, database: Optional[str] = None):
+        self.driver = driver
+        self.database = database
+        self.ttl = ttl
+        self.sample_size = sample_size
+        self.schema = ""
+        self.version = ""
+        self._loaded_at = 0.0
+        self._stale = True
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> str:
+        """返回 schema 文本，过期或被标记失效时先刷新"""
+        if self._stale or time.monotonic() - self._loaded_at > self.ttl:
+            async with self._lock:
+                # 等锁期间可能已被其他请求刷新
+                if self._stale or time.monotonic() - self._loaded_at > self.ttl:
+                    await self.refresh()
+        return self.schema
+
+    def invalidate(self, labels: Optional[Set[str]] = None):
+        """标记失效，下次 get() 时刷新；labels 参数用于兼容 GraphChangeWatcher 回调"""
+        self._stale = True
+
+    async def refresh(self):
+        with tracer.span("schema_refresh"):
+            node_props = await self._fetch_node_properties()
+            relationships = await self._fetch_relationships(sorted(node_props))
+        schema = self._render(node_props, relationships)
+        version = hashlib.sha1(schema.encode("utf-8")).hexdigest()[:12]
+        if version != self.version:
+            print(f"schema 已刷新, version={version}")
+        self.schema = schema
+        self.version = version
+        self._loaded_at = time.monotonic()
+        self._stale = False
+
+    async def _fetch_node_properties(self) -> Dict[str, Dict[str, str]]:
+        records, _, _ = await self.driver.execute_query(
+            """
+            CALL db.schema.nodeTypeProperties()
+            YIELD nodeLabels, propertyName, propertyTypes
+            RETURN nodeLabels, propertyName, propertyTypes
+            """,
+            routing_=RoutingControl.READ,
+            database_=self.database,
+        )
+        node_props = {}
+        for record in records:
+            for label in record["nodeLabels"]:
+                props = node_props.setdefault(label, {})
+                name = record["propertyName"]
+                if name is None or name.startswith(HIDDEN_PROPERTY_PREFIXES):
+                    continue
+                types = record["propertyTypes"] or []
+                props[name] = types[0].upper() if types else "ANY"
+        return node_props
+
+    async def _fetch_relationships(self, labels: List[str]) -> List[tuple]:
+        """
+        按 (起点标签, 关系类型) 采样出边，得到 (起点标签, 关系类型, 终点标签) 三元组
+
+        每种关系类型单独采样: 只按标签采样时，SPU/SKU 这类高出度标签的前若干条边
+        可能全是同一种关系，其他关系类型会从 schema 中漏掉。
+        """
+        records, _, _ = await self.driver.execute_query(
+            "CALL db.relationshipTypes() YIELD relationshipType RETURN relationshipType",
+            routing_=RoutingControl.READ,
+            database_=self.database,
+        )
+        rel_types = sorted(record["relationshipType"] for record in records)
+        patterns = set()
+        for label in labels:
+            for rel_type in rel_types:
+                records, _, _ = await self.driver.execute_query(
+                    f"""
+                    MATCH (n:`{label}`)-[r:`{rel_type}`]->(m)
+                    WITH m LIMIT $sample_size
+                    RETURN DISTINCT labels(m) AS end_labels
+                    """,
+                    sample_size=self.sample_size,
+                    routing_=RoutingControl.READ,
+                    database_=self.database,
+                )
+                for record in records:
+                    for end_label in record["end_labels"]:
+                        patterns.add((label, rel_type, end_label))
+        return sorted(patterns)
+
+    @staticmethod
+    def _render(node_props: Dict[str, Dict[str, str]], relationships: List[tuple]) -> str:
+        lines = ["节点:"]
+        for label in sorted(node_props):
+            props = ", ".join(f"{name}: {type_}" for name, type_ in sorted(node_props[label].items()))
+            lines.append(f"{label} {{{props}}}")
+        lines.append("关系:")
+        for start, rel_type, end in relationships:
+            lines.append(f"(:{start})-[:{rel_type}]->(:{end})")
+        return "\n".join(lines)
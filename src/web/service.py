@@ -1,18 +1,38 @@
+import asyncio
 import re
-from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_community.chat_models import ChatTongyi
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_neo4j import Neo4jGraph, Neo4jVector
-from neo4j_graphrag.types import SearchType
+from neo4j import RoutingControl
 
+from src.common.embedding_cache import CachedEmbeddings, EmbeddingStore
+from src.common.graph_db import Neo4jConnections
+from src.common.signals import GraphChangeSignal, GraphChangeWatcher
 from src.conf import config
+from src.web.alignment import Neo4jHybridAligner
+from src.web.cache import (
+    AlignmentCache,
+    LRUCache,
+    QueryResultCache,
+    SemanticCypherCache,
+    answer_cache_key,
+)
+from src.web.local_index import LocalHybridAligner
+from src.web.ner_service import NerService
+from src.web.schema_cache import SchemaCache
+from src.web.tracing import token_usage, tracer
 
 
 class ChatService:
-    def __init__(self):
+    # 预热任务的调度选项 (见 web.startup.Startup.add): NER 只用于预对齐，不可用时问答照常进行，不影响就绪；
+    # 模型文件损坏、权重与网络结构不匹配等加载错误重试也无法恢复
+    WARMUP_OPTIONS = {"ner": {"optional": True, "fatal": (OSError, RuntimeError, ValueError)}}
+
+    def __init__(self, neo4j: Neo4jConnections):
         # Initialize LLM (Ali Bailian)
 
         self.llm = ChatTongyi(
@@ -20,72 +40,74 @@ class ChatService:
             api_key=config.BAILIAN_API_KEY,
         )
 
-        # Initialize Neo4j connections
-        self.graph = Neo4jGraph(
-            url=config.NEO4J_CONFIG["url"],
-            username=config.NEO4J_CONFIG["user"],
-            password=config.NEO4J_CONFIG["password"],
+        # 进程共享连接池中的原生异步 driver，用于在事件循环内执行 Cypher 查询
+        self.neo4j = neo4j
+        self.async_driver = neo4j.async_driver
+
+        # Schema 缓存：启动时计算一次，按 TTL 或图变更信号刷新
+        self.schema_cache = SchemaCache(self.async_driver, ttl=config.SCHEMA_CACHE_TTL, database=neo4j.database)
+        self.change_watcher = GraphChangeWatcher(GraphChangeSignal(config.GRAPH_CHANGE_FILE))
+        self.change_watcher.subscribe(self.schema_cache.invalidate)
+
+        # Embeddings for hybrid retrieval，外面包一层与索引构建共享的持久化缓存
+        # 模型在 load_embeddings() 中于后台加载，构造 ChatService 本身不做耗时操作
+        self.embedding_store = EmbeddingStore(config.EMBEDDING_CACHE_FILE, config.EMBEDDING_CACHE_MAX_ENTRIES)
+        self.embeddings: Optional[CachedEmbeddings] = None
+        self._embeddings_task: Optional[asyncio.Future] = None
+
+        # 进程内的 NER 模型 (微批推理)，识别出的实体与 LLM 调用并发预对齐
+        if config.NER_BACKEND == "onnx":
+            onnx_file = config.NER_ONNX_QUANTIZED_FILE if config.NER_ONNX_QUANTIZED else config.NER_ONNX_MODEL_FILE
+            ner_model = config.NER_ONNX_DIR / onnx_file
+        else:
+            ner_model = config.NER_MODEL_DIR
+        self.ner = NerService(
+            ner_model,
+            tokenizer_name=config.MODEL_NAME,
+            max_batch_size=config.NER_MAX_BATCH_SIZE,
+            max_latency_ms=config.NER_MAX_LATENCY_MS,
+            max_length=config.NER_MAX_LENGTH,
+            backend=config.NER_BACKEND,
         )
 
-        # Embeddings + Vector store for hybrid retrieval
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="BAAI/bge-small-zh-v1.5",
-            encode_kwargs={"normalize_embeddings": True}
+        # embedding 推理没有原生异步实现，放到有界线程池中执行，
+        # 避免阻塞事件循环，同时限制并发的模型前向计算数量
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.CHAT_EXECUTOR_WORKERS,
+            thread_name_prefix="chat-embedding",
         )
 
-        self.vector_stores = {
-            "SPU": Neo4jVector.from_existing_index(
-                url=config.NEO4J_CONFIG["url"],
-                username=config.NEO4J_CONFIG["user"],
-                password=config.NEO4J_CONFIG["password"],
-                embedding=self.embeddings,
-                index_name="spu_embedding_index",
-                keyword_index_name="spu_full_text_index",
-                search_type=SearchType.HYBRID,
-            ),
-            "BaseTrademark": Neo4jVector.from_existing_index(
-                url=config.NEO4J_CONFIG["url"],
-                username=config.NEO4J_CONFIG["user"],
-                password=config.NEO4J_CONFIG["password"],
-                embedding=self.embeddings,
-                index_name="trademark_embedding_index",
-                keyword_index_name="trademark_full_text_index",
-                search_type=SearchType.HYBRID,
-            ),
-            "Category3": Neo4jVector.from_existing_index(
-                url=config.NEO4J_CONFIG["url"],
-                username=config.NEO4J_CONFIG["user"],
-                password=config.NEO4J_CONFIG["password"],
-                embedding=self.embeddings,
-                index_name="category3_embedding_index",
-                keyword_index_name="category3_full_text_index",
-                search_type=SearchType.HYBRID,
-            ),
-            "Category2": Neo4jVector.from_existing_index(
-                url=config.NEO4J_CONFIG["url"],
-                username=config.NEO4J_CONFIG["user"],
-                password=config.NEO4J_CONFIG["password"],
-                embedding=self.embeddings,
-                index_name="category2_embedding_index",
-                keyword_index_name="category2_full_text_index",
-                search_type=SearchType.HYBRID,
-            ),
-            "Category1": Neo4jVector.from_existing_index(
-                url=config.NEO4J_CONFIG["url"],
-                username=config.NEO4J_CONFIG["user"],
-                password=config.NEO4J_CONFIG["password"],
-                embedding=self.embeddings,
-                index_name="category1_embedding_index",
-                keyword_index_name="category1_full_text_index",
-                search_type=SearchType.HYBRID,
-            ),
-        }
+        # 每个标签一个混合检索对齐器，引擎 (neo4j / local) 由 config.ALIGNMENT_ENGINES 选择
+        # 本地快照只由索引构建 (source="index") 更新，datasync 的变更不需要重新加载
+        self.aligners = {label: self._create_aligner(label) for label in config.ALIGNMENT_INDEXES}
+        self._reload_task: Optional[asyncio.Task] = None
+        self.change_watcher.subscribe(self._schedule_reload, sources={"index"})
+
+        # 问题 → Cypher 语义缓存，命中时跳过生成 Cypher 的 LLM 调用
+        self.cypher_cache = SemanticCypherCache(
+            threshold=config.CYPHER_CACHE_THRESHOLD,
+            max_size=config.CYPHER_CACHE_SIZE,
+            ttl=config.CYPHER_CACHE_TTL,
+            exact_threshold=config.CYPHER_CACHE_EXACT_THRESHOLD,
+        )
+
+        # 实体对齐结果缓存，datasync 改写某个标签后按标签清空
+        self.alignment_cache = AlignmentCache(
+            max_size_per_label=config.ALIGNMENT_CACHE_SIZE,
+            ttl=config.ALIGNMENT_CACHE_TTL,
+        )
+        self.change_watcher.subscribe(self.alignment_cache.purge)
+
+        # 查询结果缓存 (按标签失效) 与最终答案缓存 (键中包含查询结果，数据变化后自然不再命中)
+        self.result_cache = QueryResultCache(max_bytes=config.RESULT_CACHE_MAX_BYTES, ttl=config.RESULT_CACHE_TTL)
+        self.change_watcher.subscribe(self.result_cache.invalidate)
+        self.answer_cache = LRUCache(max_size=config.ANSWER_CACHE_SIZE, ttl=config.ANSWER_CACHE_TTL)
 
         self.json_parser = JsonOutputParser()
         self.str_parser = StrOutputParser()
         self._cypher_param_regex = re.compile(r"param_\d+")
 
-    def _generate_cypher(self, question: str, schema_info: str):
+    async def _generate_cypher(self, question: str, schema_info: str):
         """
         使用 LLM 生成参数化的 Neo4j Cypher 查询语句
         
@@ -98,15 +120,18 @@ class ChatService:
         ┌─────────────────────────────────────────────────────────┐
         │ 角色定位: 专业的 Neo4j Cypher 查询生成器                │
         ├─────────────────────────────────────────────────────────┤
-        │ 输入信息:                                                │
-        │   - 用户问题: {question}                                │
-        │   - 知识图谱结构: {schema_info}                         │
-        ├─────────────────────────────────────────────────────────┤
         │ 输出要求:                                                │
         │   1. 生成参数化 Cypher (使用 param_0, param_1...)       │
         │   2. 识别需要实体对齐的参数                             │
         │   3. 返回 JSON 格式结果                                 │
+        ├─────────────────────────────────────────────────────────┤
+        │ 输入信息:                                                │
+        │   - 知识图谱结构: {schema_info}                         │
+        │   - 用户问题: {question}                                │
         └─────────────────────────────────────────────────────────┘
+
+        指令和缓存的 schema 在前、问题放在最后，schema 未变化时各请求的 prompt 前缀完全相同，
+        可以命中模型服务端的前缀缓存。
         
         期望的 LLM 返回格式:
         {
@@ -137,10 +162,6 @@ class ChatService:
             template="""
                 你是一个专业的Neo4j Cypher查询生成器。你的任务是根据用户问题生成一条Cypher查询语句，用于从知识图谱中获取回答用户问题所需的信息。
 
-                用户问题：{question}
-
-                知识图谱结构信息：{schema_info}
-
                 要求：
                 1. 生成参数化Cypher查询语句，用param_0, param_1等代替具体值
                 2. 识别需要对齐的实体
@@ -154,66 +175,296 @@ class ChatService:
                       "label": "节点类型"
                     }}
                   ]
-                }}"""
+                }}
+
+                知识图谱结构信息：{schema_info}
+
+                用户问题：{question}"""
         ).format(schema_info=schema_info, question=question)
-        cypher = self.llm.invoke(generate_cypher_prompt)
+        with tracer.span("llm.cypher", purpose="generate_cypher") as span:
+            cypher = await self.llm.ainvoke(generate_cypher_prompt)
+            span["attributes"].update(token_usage(cypher))
         cypher = self.json_parser.invoke(cypher)
         return cypher
 
-    def _entity_align(self, entities_to_align: List[Dict[str, str]]) -> List[Dict[str, str]]:
-        """使用向量+关键词检索修正实体名称"""
+    def _create_aligner(self, label: str):
+        if config.ALIGNMENT_ENGINES.get(label) == "local":
+            snapshot_dir = config.ALIGNMENT_SNAPSHOT_DIR / label
+            if LocalHybridAligner.snapshot_exists(snapshot_dir):
+                return LocalHybridAligner.load(snapshot_dir, executor=self.executor)
+            print(f"未找到 {label} 的本地对齐快照 {snapshot_dir}，回退到 Neo4j 检索")
+        index_name, keyword_index_name = config.ALIGNMENT_INDEXES[label]
+        return Neo4jHybridAligner(self.async_driver, index_name, keyword_index_name, database=self.neo4j.database)
+
+    def _schedule_reload(self, labels=None):
+        """
+        索引重建后在后台重新加载本地快照
+
+        poll() 在请求路径上调用，构建关键词索引、映射快照文件放到线程池中执行；
+        加载完成前继续使用旧的对齐器。多次重建按顺序加载。
+        """
+        labels = [
+            label for label in config.ALIGNMENT_INDEXES
+            if config.ALIGNMENT_ENGINES.get(label) == "local" and (labels is None or label in labels)
+        ]
+        if labels:
+            self._reload_task = asyncio.create_task(self._reload_local_aligners(labels, self._reload_task))
+
+    async def _reload_local_aligners(self, labels: List[str], previous: Optional[asyncio.Task] = None):
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        loop = asyncio.get_running_loop()
+        for label in labels:
+            try:
+                self.aligners[label] = await loop.run_in_executor(self.executor, self._create_aligner, label)
+            except Exception as e:
+                print(f"重新加载 {label} 的本地对齐快照失败: {e}")
+                continue
+            # 收到信号到换上新快照之间，请求仍在用旧快照对齐，结果可能已经写入缓存；
+            # 换上之后再清一次该标签的对齐缓存，以及可能用到旧对齐结果的查询结果和答案缓存
+            self.alignment_cache.purge([label])
+            self.result_cache.invalidate([label])
+            self.answer_cache.clear()
+
+    def _build_embeddings(self) -> CachedEmbeddings:
+        """加载模型并做一次推理预热 (首次前向计算较慢)，在线程池中执行"""
+        model = HuggingFaceEmbeddings(
+            model_name=config.EMBEDDING_MODEL_NAME,
+            encode_kwargs={"normalize_embeddings": True}
+        )
+        # 直接调用模型而不经过缓存，保证真的执行了一次前向计算
+        model.embed_documents(["预热"])
+        return CachedEmbeddings(model, self.embedding_store, config.EMBEDDING_MODEL_NAME)
+
+    async def load_embeddings(self) -> CachedEmbeddings:
+        """加载 embedding 模型，并发调用只加载一次；加载失败后下次调用会重新加载"""
+        task = self._embeddings_task
+        if task is None or (task.done() and task.exception() is not None):
+            loop = asyncio.get_running_loop()
+            task = self._embeddings_task = loop.run_in_executor(self.executor, self._build_embeddings)
+        self.embeddings = await asyncio.shield(task)
+        return self.embeddings
+
+    async def _embed_query(self, text: str) -> List[float]:
+        """在线程池中计算单条文本的 embedding"""
+        embeddings = await self.load_embeddings()
+        loop = asyncio.get_running_loop()
+        with tracer.span("embed", count=1):
+            return await loop.run_in_executor(self.executor, embeddings.embed_query, text)
+
+    async def _embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """在线程池中批量计算 embedding，一次前向计算处理所有文本"""
+        embeddings = await self.load_embeddings()
+        loop = asyncio.get_running_loop()
+        with tracer.span("embed", count=len(texts)):
+            return await loop.run_in_executor(self.executor, embeddings.embed_documents, texts)
+
+    async def _entity_align(self, entities_to_align: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        使用向量+关键词检索修正实体名称
+
+        先查对齐缓存，未命中的实体 embedding 一次批量计算，再按标签分组，
+        每个标签一条 UNWIND 查询，各标签的查询并发执行。
+        """
+        nodes = []
         for node in entities_to_align:
-            if node['label'] in self.vector_stores:
-                results = self.vector_stores[node['label']].similarity_search(node['entity'], k=1)
-                if results:
-                    node['entity'] = results[0].page_content
+            if node['label'] not in self.aligners:
+                continue
+            cached = self.alignment_cache.get(node['label'], node['entity'])
+            if cached:
+                node['entity'] = cached[0]
+            else:
+                nodes.append(node)
+        if not nodes:
+            return entities_to_align
+        results = await self._align([(node['label'], node['entity']) for node in nodes])
+        for node, result in zip(nodes, results):
+            if result:
+                node['entity'] = result[0]
         return entities_to_align
 
-    def _execute_cypher(self, cypher: str, prams: Dict[str, str]) -> List[Dict[str, Any]]:
-        """执行 Cypher 查询并返回结果"""
-        results = self.graph.query(cypher, params=prams)
-        return results
+    async def _align(self, pairs: List[Tuple[str, str]]) -> List[Optional[Tuple[str, float]]]:
+        """对齐 (标签, 实体) 列表并写入对齐缓存；embedding 一次批量计算，各标签的检索并发执行"""
+        vectors = await self._embed_documents([entity for _, entity in pairs])
 
-    def _generate_final_answer(self, question: str, query_result: List[Dict[str, Any]]) -> str:
+        groups: Dict[str, List[int]] = {}
+        for i, (label, _) in enumerate(pairs):
+            groups.setdefault(label, []).append(i)
+
+        async def search(label: str, indexes: List[int]):
+            aligner = self.aligners[label]
+            with tracer.span("similarity_search", label=label, engine=aligner.engine, count=len(indexes)):
+                return await aligner.search(
+                    [pairs[i][1] for i in indexes],
+                    [vectors[i] for i in indexes],
+                )
+
+        aligned: List[Optional[Tuple[str, float]]] = [None] * len(pairs)
+        searches = [search(label, indexes) for label, indexes in groups.items()]
+        for indexes, results in zip(groups.values(), await asyncio.gather(*searches)):
+            for i, result in zip(indexes, results):
+                if result:
+                    self.alignment_cache.set(pairs[i][0], pairs[i][1], result)
+                aligned[i] = result
+        return aligned
+
+    async def _prealign(self, question: str) -> List[Dict]:
         """
-        将 Cypher 查询结果生成自然语言答案
+        用 NER 模型识别问题中的实体，并对可能的标签 (config.NER_PREALIGN_LABELS) 预先对齐
+
+        与生成 Cypher 的 LLM 调用并发执行，结果写入对齐缓存；
+        LLM 给出的实体与识别出的片段一致时，实体对齐一步直接命中缓存。
+        NER 片段没有实体类型，只对词表小、名称短的标签预对齐，不查询 SPU 这样的大索引。
         """
-        prompt = PromptTemplate(
+        spans = (await self.ner.extract([question]))[0]
+        labels = [label for label in config.NER_PREALIGN_LABELS if label in self.aligners]
+        pairs = [
+            (label, span["text"])
+            for span in spans
+            for label in labels
+            if self.alignment_cache.get(label, span["text"]) is None
+        ]
+        if pairs:
+            with tracer.span("prealign", count=len(pairs)):
+                await self._align(pairs)
+        return spans
+
+    async def _execute_cypher(self, cypher: str, prams: Dict[str, str]) -> List[Dict[str, Any]]:
+        """执行 Cypher 查询并返回结果"""
+        records, _, _ = await self.async_driver.execute_query(
+            cypher,
+            parameters_=prams,
+            routing_=RoutingControl.READ,
+            database_=self.neo4j.database,
+        )
+        return [record.data() for record in records]
+
+    def _final_answer_prompt(self, question: str, query_result: List[Dict[str, Any]]) -> str:
+        return PromptTemplate(
             input_variables=["question", "query_result"],
             template="""
                 你是一个电商智能客服，根据用户问题，以及数据库查询结果生成一段简洁、准确的自然语言回答。
                 用户问题: {question}
                 数据库返回结果: {query_result}
             """).format(question=question, query_result=query_result)
-        result = self.llm.invoke(prompt)
+
+    async def _generate_final_answer(self, question: str, query_result: List[Dict[str, Any]]) -> str:
+        """
+        将 Cypher 查询结果生成自然语言答案
+        """
+        with tracer.span("llm.answer", purpose="generate_answer") as span:
+            result = await self.llm.ainvoke(self._final_answer_prompt(question, query_result))
+            span["attributes"].update(token_usage(result))
         return self.str_parser.invoke(result)
 
-    async def chat(self, question: str):
+    async def _stream_final_answer(self, question: str, query_result: List[Dict[str, Any]]) -> AsyncIterator[str]:
+        """流式生成最终答案，LLM 每返回一段文本就产出一段"""
+        with tracer.span("llm.answer", purpose="generate_answer", stream=True) as span:
+            aggregate = None
+            async for chunk in self.llm.astream(self._final_answer_prompt(question, query_result)):
+                aggregate = chunk if aggregate is None else aggregate + chunk
+                if chunk.content:
+                    yield chunk.content
+            if aggregate is not None:
+                span["attributes"].update(token_usage(aggregate))
+
+    def warmup_tasks(self) -> Dict[str, Callable[[], Awaitable[Any]]]:
+        """启动时在后台并发执行的预热任务，由 web.startup.Startup 调度"""
+        return {
+            "neo4j": self.async_driver.verify_connectivity,
+            "embeddings": self.load_embeddings,
+            "schema": self.schema_cache.refresh,
+            "ner": self.ner.load,
+        }
+
+    async def chat(self, question: str) -> str:
+        """非流式问答，返回完整答案"""
+        answer = ""
+        async for event in self.chat_stream(question, stream_answer=False):
+            if event["type"] == "workflow_end":
+                answer = event["data"]["answer"]
+        return answer
+
+    async def chat_stream(self, question: str, stream_answer: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        """
+        执行问答流程，以事件的形式逐步产出结果
+
+        每个事件同时推送到监控面板，格式为 {"type": 事件类型, "data": 事件数据}:
+        - workflow_start / step_start / step_end / workflow_end: 各阶段的开始与结束，
+          step_end 带有该步骤的耗时 duration_ms
+        - answer_token: stream_answer=True 时最终答案的增量文本 (不推送到监控面板)
+
+        整个流程记录为一个 Trace，可通过 /api/traces 查看。
+        """
+        trace = tracer.start_trace("chat", question=question)
+        try:
+            async for event in self._chat_events(question, stream_answer, trace.request_id):
+                yield event
+        finally:
+            tracer.finish_trace(trace)
+
+    async def _chat_events(self, question: str, stream_answer: bool, request_id: str) -> AsyncIterator[Dict[str, Any]]:
         from src.web.monitor import emit_event
-        
-        await emit_event("workflow_start", {"question": question})
-        
+
+        def publish(event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+            emit_event(event_type, data)
+            return {"type": event_type, "data": data}
+
+        # 检查 datasync / 索引重建是否修改过图谱
+        self.change_watcher.poll()
+
+        yield publish("workflow_start", {"question": question, "request_id": request_id})
+
         print("\n" + "=" * 80)
         print("🔍 开始处理问题:", question)
         print("=" * 80)
 
-        # Step 1: 生成 Cypher
-        await emit_event("step_start", {"step": "generate_cypher", "description": "Generating Cypher Query"})
+        # Step 1: 生成 Cypher (同时用 NER 模型识别实体并预先对齐)
+        yield publish("step_start", {"step": "generate_cypher", "description": "Generating Cypher Query"})
         print("\n📝 Step 1: 调用 LLM 生成 Cypher...")
-        print("graph.schema----------------------------:\n", self.graph.schema)
-        
-        cypher = self._generate_cypher(question, self.graph.schema)
-        print("LLM 返回的完整结果:")
+        prealign = asyncio.create_task(self._prealign(question)) if self.ner.available else None
+        spans = []
+        try:
+            with tracer.span("generate_cypher") as span:
+                schema_info = await self.schema_cache.get()
+                question_vector = await self._embed_query(question)
+                cypher = self.cypher_cache.lookup(question_vector, question, self.schema_cache.version)
+                cache_hit = cypher is not None
+                span["attributes"]["cache_hit"] = cache_hit
+                if cache_hit:
+                    print("命中 Cypher 语义缓存:")
+                else:
+                    cypher = await self._generate_cypher(question, schema_info)
+                    if "cypher_query" in cypher:
+                        self.cypher_cache.store(question_vector, question, cypher, self.schema_cache.version)
+                    print("LLM 返回的完整结果:")
+                # 命中缓存时没有 LLM 调用可以重叠，不再等待预对齐；否则最多再等待 NER_PREALIGN_TIMEOUT_MS
+                if prealign is not None and not cache_hit:
+                    await asyncio.wait({prealign}, timeout=config.NER_PREALIGN_TIMEOUT_MS / 1000)
+                    if prealign.done() and not prealign.cancelled() and prealign.exception() is None:
+                        spans = prealign.result()
+        finally:
+            if prealign is not None:
+                # 未完成的预对齐取消掉 (包括生成 Cypher 出错时)，并取回异常，避免 "never retrieved" 警告
+                prealign.cancel()
+                result = (await asyncio.gather(prealign, return_exceptions=True))[0]
+                if isinstance(result, Exception):
+                    # 预对齐只是优化，失败时实体对齐照常进行
+                    print(f"NER 预对齐失败: {result}")
         print(cypher)
 
         cypher_query = cypher["cypher_query"]
         entities_to_align = cypher["entities_to_align"]
-        
-        await emit_event("step_end", {
-            "step": "generate_cypher", 
+
+        yield publish("step_end", {
+            "step": "generate_cypher",
+            "duration_ms": span["duration_ms"],
             "output": {
                 "cypher_query": cypher_query,
-                "entities_to_align": entities_to_align
+                "entities_to_align": entities_to_align,
+                "ner_spans": spans,
+                "cache_hit": cache_hit,
+                "cache_stats": self.cypher_cache.stats(),
             }
         })
 
@@ -222,40 +473,84 @@ class ChatService:
         print(f"  - 需要对齐的实体数量: {len(entities_to_align)}")
         print(f"  - 实体列表: {entities_to_align}")
 
-        # Step 2: 实体对齐
-        await emit_event("step_start", {"step": "entity_align", "description": "Aligning Entities"})
+        # Step 2: 实体对齐 (先记下实体原文，用于构造答案缓存的问题模板)
+        surfaces = {node.get("param_name"): node.get("entity") for node in entities_to_align}
+        yield publish("step_start", {"step": "entity_align", "description": "Aligning Entities"})
         print("\n🔄 Step 2: 实体对齐...")
-        entities = self._entity_align(entities_to_align)
+        with tracer.span("entity_align", count=len(entities_to_align)) as span:
+            entities = await self._entity_align(entities_to_align)
         print(f"对齐后的实体: {entities}")
-        await emit_event("step_end", {"step": "entity_align", "output": {"entities": entities}})
+        yield publish("step_end", {
+            "step": "entity_align",
+            "duration_ms": span["duration_ms"],
+            "output": {"entities": entities, "cache_stats": self.alignment_cache.stats()},
+        })
 
         # Step 3: 构建参数
-        await emit_event("step_start", {"step": "build_params", "description": "Building Parameters"})
+        yield publish("step_start", {"step": "build_params", "description": "Building Parameters"})
         print("\n🔧 Step 3: 构建查询参数...")
-        params = self._build_params(cypher_query, entities, question)
+        with tracer.span("build_params") as span:
+            params = self._build_params(cypher_query, entities, question)
         print(f"最终参数字典: {params}")
-        await emit_event("step_end", {"step": "build_params", "output": {"params": params}})
+        yield publish("step_end", {
+            "step": "build_params",
+            "duration_ms": span["duration_ms"],
+            "output": {"params": params},
+        })
 
         # Step 4: 执行查询
-        await emit_event("step_start", {"step": "execute_cypher", "description": "Executing Cypher Query"})
+        yield publish("step_start", {"step": "execute_cypher", "description": "Executing Cypher Query"})
         print("\n⚡ Step 4: 执行 Cypher 查询...")
         print(f"执行的 Cypher: {cypher_query}")
         print(f"使‘用的参数: {params}")
 
-        query_result = self._execute_cypher(cypher_query, params)
+        with tracer.span("execute_cypher") as span:
+            query_result = self.result_cache.get(cypher_query, params)
+            result_cache_hit = query_result is not None
+            if not result_cache_hit:
+                query_result = await self._execute_cypher(cypher_query, params)
+                self.result_cache.set(cypher_query, params, query_result)
+            span["attributes"].update(rows=len(query_result), cache_hit=result_cache_hit)
 
         print(f"\n✅ 查询结果: {query_result}")
         print("=" * 80 + "\n")
-        await emit_event("step_end", {"step": "execute_cypher", "output": {"result": query_result}})
-        
+        yield publish("step_end", {
+            "step": "execute_cypher",
+            "duration_ms": span["duration_ms"],
+            "output": {
+                "result": query_result,
+                "cache_hit": result_cache_hit,
+                "cache_stats": self.result_cache.stats(),
+            },
+        })
+
         # Step 5: 生成回答
-        await emit_event("step_start", {"step": "generate_answer", "description": "Generating Final Answer"})
-        answer = self._generate_final_answer(question, query_result)
-        await emit_event("step_end", {"step": "generate_answer", "output": {"answer": answer}})
-        
-        await emit_event("workflow_end", {"answer": answer})
+        yield publish("step_start", {"step": "generate_answer", "description": "Generating Final Answer"})
+        answer_key = answer_cache_key(question, surfaces, params, query_result)
+        with tracer.span("generate_answer", stream=stream_answer) as span:
+            answer = self.answer_cache.get(answer_key)
+            answer_cache_hit = answer is not None
+            span["attributes"]["cache_hit"] = answer_cache_hit
+            if answer_cache_hit:
+                if stream_answer:
+                    yield {"type": "answer_token", "data": {"text": answer}}
+            elif stream_answer:
+                tokens = []
+                async for token in self._stream_final_answer(question, query_result):
+                    tokens.append(token)
+                    yield {"type": "answer_token", "data": {"text": token}}
+                answer = "".join(tokens)
+            else:
+                answer = await self._generate_final_answer(question, query_result)
+            if not answer_cache_hit:
+                self.answer_cache.set(answer_key, answer)
+        yield publish("step_end", {
+            "step": "generate_answer",
+            "duration_ms": span["duration_ms"],
+            "output": {"answer": answer, "cache_hit": answer_cache_hit},
+        })
 
-        return answer
+        yield publish("workflow_end", {"answer": answer, "request_id": request_id})
 
     def _build_params(self, cypher_query: str, entities: List[Dict[str, str]], question: str) -> Dict[str, str]:
         """Build parameter dict and fill missing params with the raw question text."""
@@ -267,3 +562,12 @@ class ChatService:
             # Fallback: use the user question when the model doesn't provide a value.
             params[name] = question
         return params
+
+    async def close(self):
+        """释放线程池和 embedding 缓存 (Neo4j 连接池由创建方关闭)"""
+        if self._reload_task is not None:
+            self._reload_task.cancel()
+            await asyncio.gather(self._reload_task, return_exceptions=True)
+        self.executor.shutdown(wait=False)
+        await self.ner.close()
+        self.embedding_store.close()
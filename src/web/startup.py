@@ -0,0 +1,78 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple, Type
+
+# 组件启动失败后的重试间隔 (秒)，指数增长到上限为止
+RETRY_INITIAL_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+# 重试也无法恢复的错误 (文件缺失、依赖未安装等)，出现后组件直接标记为失败
+FATAL_ERRORS = (FileNotFoundError, NotADirectoryError, PermissionError, ImportError)
+
+
+class Startup:
+    """
+    服务依赖的后台启动与预热
+
+    各组件 (Neo4j 连接、embedding 模型、schema 等) 在后台并发启动，不阻塞 uvicorn 接受请求；
+    失败的组件按指数退避重试 (例如 Neo4j 晚于 Web 服务启动)，FATAL_ERRORS 和组件声明的 fatal 异常不再重试。
+    /healthz 只表示进程存活，/readyz 在所有必需组件就绪后才返回 200，供滚动发布和负载均衡判断；
+    可选组件 (optional=True) 失败时服务降级运行，状态照常在 /readyz 中展示。
+    """
+
+    def __init__(self):
+        self._components: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self._fatal: Dict[str, Tuple[Type[BaseException], ...]] = {}
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def add(self, name: str, factory: Callable[[], Awaitable[Any]], optional: bool = False,
+            fatal: Tuple[Type[BaseException], ...] = ()):
+        self._components[name] = factory
+        self._fatal[name] = FATAL_ERRORS + tuple(fatal)
+        self._status[name] = {
+            "status": "pending", "optional": optional, "attempts": 0, "duration_ms": None, "error": None,
+        }
+
+    def start(self):
+        """在当前事件循环中启动所有组件，立即返回"""
+        for name, factory in self._components.items():
+            self._tasks[name] = asyncio.create_task(self._run(name, factory), name=f"startup:{name}")
+
+    async def _run(self, name: str, factory: Callable[[], Awaitable[Any]]):
+        status = self._status[name]
+        delay = RETRY_INITIAL_DELAY
+        while True:
+            status["status"] = "starting"
+            status["attempts"] += 1
+            start = time.perf_counter()
+            try:
+                await factory()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                status["status"] = "failed"
+                status["error"] = repr(e)
+                if isinstance(e, self._fatal[name]):
+                    print(f"启动 {name} 失败 (第 {status['attempts']} 次)，错误无法通过重试恢复: {e}")
+                    return
+                print(f"启动 {name} 失败 (第 {status['attempts']} 次)，{delay:.0f}s 后重试: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_DELAY)
+                continue
+            status["status"] = "ready"
+            status["error"] = None
+            status["duration_ms"] = (time.perf_counter() - start) * 1000
+            print(f"{name} 已就绪，耗时 {status['duration_ms']:.0f}ms")
+            return
+
+    @property
+    def ready(self) -> bool:
+        return all(status["status"] == "ready" for status in self._status.values() if not status["optional"])
+
+    def status(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "components": self._status}
+
+    async def stop(self):
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
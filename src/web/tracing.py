@@ -0,0 +1,132 @@
+import math
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from src.conf import config
+from src.web.monitor import emit_event
+
+# 当前请求的 Trace，asyncio.gather 创建的子任务会继承它，子操作无需显式传参
+current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """一次问答请求的追踪记录，spans 按结束顺序排列"""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.request_id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.attributes = attributes
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "name": self.name,
+            "attributes": self.attributes,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "spans": self.spans,
+        }
+
+
+def token_usage(message) -> Dict[str, int]:
+    """从 LLM 返回的消息中提取 token 数量"""
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        return {"input_tokens": usage.get("input_tokens", 0), "output_tokens": usage.get("output_tokens", 0)}
+    usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    return {"input_tokens": usage.get("input_tokens", 0), "output_tokens": usage.get("output_tokens", 0)}
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    """最近秩法求百分位数，values 需已排序"""
+    index = max(math.ceil(percent / 100 * len(values)) - 1, 0)
+    return values[index]
+
+
+class Tracer:
+    """
+    轻量的请求追踪
+
+    每个问答请求一个 Trace (带 request_id)，步骤和子操作 (向量检索、LLM 调用等)
+    记录为 span: 相对请求开始的 start_ms 与 duration_ms (单调时钟)。
+    span 结束时推送到监控面板；完成的 Trace 保存在环形缓冲区中，
+    每种 span 另外保留最近的耗时样本用于计算 p50/p95/p99。
+    """
+
+    def __init__(self, buffer_size: int, sample_size: int = 1000):
+        self.traces: Deque[Trace] = deque(maxlen=buffer_size)
+        self._durations: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=sample_size))
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """注册 span 结束时的回调 (如指标采集)"""
+        self._listeners.append(listener)
+
+    def start_trace(self, name: str, **attributes) -> Trace:
+        trace = Trace(name, attributes)
+        current_trace.set(trace)
+        return trace
+
+    def finish_trace(self, trace: Trace):
+        trace.duration_ms = (time.perf_counter() - trace.start) * 1000
+        self.traces.append(trace)
+        self._durations[trace.name].append(trace.duration_ms)
+        current_trace.set(None)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Dict[str, Any]]:
+        """
+        记录一个 span，返回的字典可以在 with 块中补充属性 (如 token 数)
+
+        用法:
+            with tracer.span("llm.cypher", purpose="generate_cypher") as span:
+                result = await llm.ainvoke(prompt)
+                span["attributes"].update(token_usage(result))
+        """
+        trace = current_trace.get()
+        start = time.perf_counter()
+        span = {"name": name, "attributes": attributes}
+        try:
+            yield span
+        except Exception as e:
+            span["error"] = repr(e)
+            raise
+        finally:
+            end = time.perf_counter()
+            span["duration_ms"] = (end - start) * 1000
+            self._durations[name].append(span["duration_ms"])
+            if trace is not None:
+                span["start_ms"] = (start - trace.start) * 1000
+                trace.spans.append(span)
+            for listener in self._listeners:
+                listener(span)
+            emit_event("span", {"request_id": trace.request_id if trace else None, **span})
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return [trace.to_dict() for trace in list(self.traces)[-limit:]][::-1]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for name, durations in list(self._durations.items()):
+            values = sorted(durations)
+            if not values:
+                continue
+            result[name] = {
+                "count": len(values),
+                "p50": _percentile(values, 50),
+                "p95": _percentile(values, 95),
+                "p99": _percentile(values, 99),
+            }
+        return result
+
+
+# Global instance
+tracer = Tracer(config.TRACE_BUFFER_SIZE)
@@ -1,58 +1,196 @@
+import argparse
+import hashlib
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_neo4j import Neo4jGraph
 
-from conf.config import NEO4J_CONFIG
+from common.embedding_cache import CachedEmbeddings, EmbeddingStore
+from common.graph_db import Neo4jConnections
+from common.signals import GraphChangeSignal
+from conf.config import (
+    ALIGNMENT_ENGINES,
+    ALIGNMENT_INDEXES,
+    ALIGNMENT_SNAPSHOT_DIR,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_CACHE_FILE,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_FETCH_SIZE,
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_THREADS,
+    GRAPH_CHANGE_FILE,
+    NEO4J_CONFIG,
+)
+from web.local_index import META_FILE, export_snapshot
+
 
+def drop_index_if_exists(driver, name: str, database=None):
+    driver.execute_query(f"DROP INDEX {name} IF EXISTS", database_=database)
 
-def drop_index_if_exists(graph, name: str):
-    graph.query(f"DROP INDEX {name} IF EXISTS")
 
+def _index_matches(index, type_, label, property):
+    """SHOW INDEXES 返回的索引是否与期望的类型、标签、属性一致"""
+    return (
+        index is not None
+        and index["type"] == type_
+        and list(index["labelsOrTypes"]) == [label]
+        and list(index["properties"]) == [property]
+    )
 
-def create_full_text_index(graph, index, label, property):
-    drop_index_if_exists(graph, index)
+
+def create_full_text_index(driver, index, label, property, database=None):
+    existing, _, _ = driver.execute_query(
+        "SHOW INDEXES YIELD name, type, labelsOrTypes, properties WHERE name = $name",
+        name=index,
+        database_=database,
+    )
+    if _index_matches(existing[0] if existing else None, "FULLTEXT", label, property):
+        print(f"全文索引 '{index}' 配置未变，跳过重建。")
+        return
+    drop_index_if_exists(driver, index, database)
     cypher = f"""
     CREATE FULLTEXT INDEX {index}
     FOR (n:{label})
     ON EACH [n.{property}]
     """
-    graph.query(cypher, {"index": index, "label": label, "property": property})
+    driver.execute_query(cypher, database_=database)
+
+
+def vector_index_matches(driver, index, label, embedding_property, embedding_dim, database=None):
+    """已有同名向量索引且标签、属性、维度、相似度函数都一致时返回 True"""
+    records, _, _ = driver.execute_query(
+        "SHOW INDEXES YIELD name, type, labelsOrTypes, properties, options WHERE name = $name",
+        name=index,
+        database_=database,
+    )
+    existing = records[0] if records else None
+    if not _index_matches(existing, "VECTOR", label, embedding_property):
+        return False
+    index_config = (existing["options"] or {}).get("indexConfig") or {}
+    return (
+        index_config.get("vector.dimensions") == embedding_dim
+        and str(index_config.get("vector.similarity_function", "")).lower() == "cosine"
+    )
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _pages(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _write_embeddings(tx, cypher, rows, model):
+    tx.run(cypher, rows=rows, model=model).consume()
 
 
 def create_embedding_index(
-    graph,
+    driver,
     index,
     label,
     property,
     embedding_property,
     embedding_model,
     embedding_dim,
-    batch_size=100,
+    batch_size=None,
+    threads=None,
+    fetch_size=None,
+    database=None,
+    model_id=None,
+    incremental=True,
 ):
-    # 1. 查询需要生成 embedding 的节点
+    """
+    为 label 的节点生成 embedding 并创建向量索引，返回 (本次生成的节点数, 节点总数)
+
+    增量模式: 每个节点在 embedding 旁边记录 name 的哈希 ({embedding_property}_hash)
+    和模型标识 ({embedding_property}_model)，只为新节点、name 变化或模型变化的节点重新生成；
+    向量索引的标签、属性、维度和相似度函数都没变时不再 DROP/CREATE，
+    索引在更新期间始终可用。incremental=False 时全部重新生成并重建索引。
+
+    读取: 一个读会话流式返回节点，驱动每次只拉取 fetch_size 条，不会把整个标签加载到内存；
+    编码: batch_size 条一批，提交到 threads 个线程的线程池；
+    写回: 每批一次 UNWIND $rows 写事务，在主线程中进行，与后续批次的编码重叠。
+    节点用 elementId 定位 (id() 已废弃)。
+    """
+    batch_size = batch_size or EMBEDDING_BATCH_SIZE
+    threads = threads or EMBEDDING_THREADS
+    fetch_size = fetch_size or EMBEDDING_FETCH_SIZE
+    model_id = model_id or getattr(embedding_model, "model_name", type(embedding_model).__name__)
+
+    # 1. 查询节点，只读取 name 和已记录的哈希/模型，不读取向量本身
     query = f"""
     MATCH (n:{label})
     WHERE n.{property} IS NOT NULL
-    RETURN id(n) as node_id, n.{property} as text
+    RETURN elementId(n) AS node_id,
+           n.{property} AS text,
+           n.{embedding_property}_hash AS hash,
+           n.{embedding_property}_model AS model,
+           n.{embedding_property} IS NOT NULL AS embedded
+    """
+    update_query = f"""
+    UNWIND $rows AS row
+    MATCH (n:{label})
+    WHERE elementId(n) = row.node_id
+    SET n.{embedding_property} = row.embedding,
+        n.{embedding_property}_hash = row.hash,
+        n.{embedding_property}_model = $model
     """
-    nodes = graph.query(query)
-
-    # 2. 批量生成 embedding 并更新节点
-    for i in range(0, len(nodes), batch_size):
-        batch = nodes[i : i + batch_size]
-        texts = [record["text"] for record in batch]
-        embeddings = embedding_model.embed_documents(texts)  # HuggingFace 批量生成 embedding
-
-        for record, emb in zip(batch, embeddings):
-            update_query = f"""
-            MATCH (n)
-            WHERE id(n) = $node_id
-            SET n.{embedding_property} = $embedding
-            """
-            graph.query(update_query, {"node_id": record["node_id"], "embedding": emb})
-    print(f"已为 {len(nodes)} 个节点生成 embedding。")
-
-    # 3. 创建向量索引（先删除再重建，避免重复报错）
-    drop_index_if_exists(graph, index)
+
+    def changed(records):
+        nonlocal seen
+        for record in records:
+            seen += 1
+            digest = text_hash(record["text"])
+            if incremental and record["embedded"] and record["hash"] == digest and record["model"] == model_id:
+                continue
+            yield {"node_id": record["node_id"], "text": record["text"], "hash": digest}
+
+    def encode(batch):
+        embeddings = embedding_model.embed_documents([record["text"] for record in batch])
+        return [
+            {"node_id": record["node_id"], "hash": record["hash"], "embedding": emb}
+            for record, emb in zip(batch, embeddings)
+        ]
+
+    # 2. 批量生成 embedding 并写回，编码中的批次数有上限，避免读取远远跑在写入前面
+    total = 0
+    seen = 0
+    start = time.perf_counter()
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="embedding") as executor, \
+            driver.session(database=database, fetch_size=fetch_size) as read_session, \
+            driver.session(database=database) as write_session:
+        result = read_session.run(query)
+        for batch in _pages(changed(result), batch_size):
+            in_flight.append(executor.submit(encode, batch))
+            if len(in_flight) > threads * 2:
+                rows = in_flight.popleft().result()
+                write_session.execute_write(_write_embeddings, update_query, rows, model_id)
+                total += len(rows)
+        while in_flight:
+            rows = in_flight.popleft().result()
+            write_session.execute_write(_write_embeddings, update_query, rows, model_id)
+            total += len(rows)
+    elapsed = time.perf_counter() - start
+    print(f"{label}: 共 {seen} 个节点，为 {total} 个节点生成 embedding，"
+          f"耗时 {elapsed:.2f}s，{total / elapsed if elapsed > 0 else 0:.0f} 个/秒。")
+
+    # 3. 创建向量索引：配置未变时保留现有索引 (节点属性更新后索引会自动更新)
+    if incremental and vector_index_matches(driver, index, label, embedding_property, embedding_dim, database):
+        print(f"向量索引 '{index}' 配置未变，跳过重建。")
+        return total, seen
+    drop_index_if_exists(driver, index, database)
     cypher_index = f"""
     CREATE VECTOR INDEX {index}
     FOR (n:{label})
@@ -63,38 +201,70 @@ def create_embedding_index(
         }}
     }}
     """
-    graph.query(cypher_index)
+    driver.execute_query(cypher_index, database_=database)
     print(f"向量索引 '{index}' 已创建。")
+    return total, seen
+
 
+def snapshot_stale(directory, count):
+    """快照不存在或节点数与图中不一致时需要重新导出"""
+    meta_file = Path(directory) / META_FILE
+    if not meta_file.exists():
+        return True
+    with open(meta_file, encoding="utf-8") as f:
+        return json.load(f).get("count") != count
 
-def drop_all_indexes(graph):
-    indexes = graph.query("show indexes where type in ['VECTOR','FULLTEXT']")
+
+def drop_all_indexes(driver, database=None):
+    indexes, _, _ = driver.execute_query("show indexes where type in ['VECTOR','FULLTEXT']", database_=database)
     indexes = [index["name"] for index in indexes]
     for index in indexes:
-        graph.query(f"drop index {index}")
+        driver.execute_query(f"drop index {index}", database_=database)
 
 
 if __name__ == "__main__":
-    graph = Neo4jGraph(
-        url=NEO4J_CONFIG["url"],
-        username=NEO4J_CONFIG["user"],
-        password=NEO4J_CONFIG["password"],
-        database=NEO4J_CONFIG.get("database", "neo4j"),
-    )
+    parser = argparse.ArgumentParser(description="构建全文索引、向量索引和本地对齐快照 (默认增量)")
+    parser.add_argument("--full", action="store_true", help="重新生成全部 embedding 并重建索引")
+    args = parser.parse_args()
 
-    create_full_text_index(graph, "spu_full_text_index", "SPU", "name")
-    create_full_text_index(graph, "trademark_full_text_index", "BaseTrademark", "name")
-    create_full_text_index(graph, "category3_full_text_index", "Category3", "name")
-    create_full_text_index(graph, "category2_full_text_index", "Category2", "name")
-    create_full_text_index(graph, "category1_full_text_index", "Category1", "name")
+    # 进程内共享的 Neo4j 连接池
+    neo4j = Neo4jConnections(NEO4J_CONFIG)
+    driver = neo4j.driver
+    database = neo4j.database
 
-    model_name = "BAAI/bge-small-zh-v1.5"
+    # 索引名称与 ChatService 使用的一致: 标签 → (向量索引, 全文索引)
+    for label, (_, full_text_index) in ALIGNMENT_INDEXES.items():
+        create_full_text_index(driver, full_text_index, label, "name", database)
+
+    model_name = EMBEDDING_MODEL_NAME
     model_kwargs = {"device": "cpu"}
     encode_kwargs = {"normalize_embeddings": True}
-    embedding_model = HuggingFaceEmbeddings(model_name=model_name, model_kwargs=model_kwargs, encode_kwargs=encode_kwargs)
+    # 与 ChatService 共享的持久化缓存，重建索引时已知名称的向量不再重新计算
+    embedding_store = EmbeddingStore(EMBEDDING_CACHE_FILE, EMBEDDING_CACHE_MAX_ENTRIES)
+    embedding_model = CachedEmbeddings(
+        HuggingFaceEmbeddings(model_name=model_name, model_kwargs=model_kwargs, encode_kwargs=encode_kwargs),
+        embedding_store,
+        model_name,
+    )
+
+    changed_labels = []
+    for label, (embedding_index, _) in ALIGNMENT_INDEXES.items():
+        updated, count = create_embedding_index(
+            driver, embedding_index, label, "name", "embedding", embedding_model, 512,
+            database=database, model_id=model_name, incremental=not args.full,
+        )
+        exported = False
+        # 只为使用本地对齐引擎的标签导出快照 (只在 embedding 有变化或节点数变化时)
+        directory = ALIGNMENT_SNAPSHOT_DIR / label
+        if ALIGNMENT_ENGINES.get(label) == "local" and (updated or args.full or snapshot_stale(directory, count)):
+            export_snapshot(driver, label, directory, database=database)
+            exported = True
+        if updated or exported:
+            changed_labels.append(label)
+
+    print(f"embedding 缓存: {embedding_store.stats()}")
+    embedding_store.close()
+    neo4j.close()
 
-    create_embedding_index(graph, "spu_embedding_index", "SPU", "name", "embedding", embedding_model, 512)
-    create_embedding_index(graph, "trademark_embedding_index", "BaseTrademark", "name", "embedding", embedding_model, 512)
-    create_embedding_index(graph, "category3_embedding_index", "Category3", "name", "embedding", embedding_model, 512)
-    create_embedding_index(graph, "category2_embedding_index", "Category2", "name", "embedding", embedding_model, 512)
-    create_embedding_index(graph, "category1_embedding_index", "Category1", "name", "embedding", embedding_model, 512)
+    if changed_labels:
+        GraphChangeSignal(GRAPH_CHANGE_FILE).notify(changed_labels, source="index")
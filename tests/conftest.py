@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# datasync / ner 模块以 src 为根目录导入 (from datasync... / from conf...)
+SRC = Path(__file__).resolve().parent.parent / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
@@ -0,0 +1,85 @@
+import numpy as np
+
+from src.web.cache import ANY_LABEL, QueryResultCache, SemanticCypherCache
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+HUAWEI_PHONES = {
+    "cypher_query": "MATCH (t:BaseTrademark {name: $param_0})<-[:Belong]-(s:SPU) RETURN s.name",
+    "entities_to_align": [{"param_name": "param_0", "entity": "华为", "label": "BaseTrademark"}],
+}
+
+
+def test_cypher_cache_reuses_same_template():
+    cache = SemanticCypherCache(threshold=0.9, max_size=10, ttl=60, exact_threshold=0.99)
+    assert cache.store(unit(1, 0), "华为有哪些手机", HUAWEI_PHONES, "v1")
+    assert cache.lookup(unit(1, 0.3), "华为有哪些手机？", "v1") is None
+    assert cache.lookup(unit(1, 0.3), " 华为有哪些手机", "v1") is not None
+
+
+def test_cypher_cache_rejects_different_template_with_same_entity():
+    cache = SemanticCypherCache(threshold=0.9, max_size=10, ttl=60, exact_threshold=0.99)
+    assert cache.store(unit(1, 0), "华为有哪些手机", HUAWEI_PHONES, "v1")
+    # 实体相同、向量相近，但查询对象不同
+    assert cache.lookup(unit(1, 0.3), "华为有哪些平板", "v1") is None
+    # 多出一个品牌
+    assert cache.lookup(unit(1, 0.3), "华为和小米有哪些手机", "v1") is None
+    # 实体不同
+    assert cache.lookup(unit(1, 0.3), "小米有哪些手机", "v1") is None
+
+
+def test_cypher_cache_rejects_different_conditions():
+    cache = SemanticCypherCache(threshold=0.9, max_size=10, ttl=60, exact_threshold=0.99)
+    value = {
+        "cypher_query": "MATCH (t:BaseTrademark {name: $param_0})<-[:Belong]-(s:SPU) RETURN s ORDER BY s.price LIMIT 1",
+        "entities_to_align": [{"param_name": "param_0", "entity": "华为", "label": "BaseTrademark"}],
+    }
+    assert cache.store(unit(1, 0), "华为最便宜的手机", value, "v1")
+    assert cache.lookup(unit(1, 0.3), "华为最贵的手机", "v1") is None
+    assert cache.store(unit(0, 1), "价格低于5000的手机", {"cypher_query": "MATCH (s:SPU) WHERE s.price < 5000 RETURN s",
+                                                     "entities_to_align": []}, "v1")
+    assert cache.lookup(unit(0.3, 1), "价格低于3000的手机", "v1") is None
+
+
+def test_cypher_cache_entity_less_entry_needs_near_exact_match():
+    cache = SemanticCypherCache(threshold=0.9, max_size=10, ttl=60, exact_threshold=0.99)
+    value = {"cypher_query": "MATCH (c:Category1) RETURN c.name", "entities_to_align": []}
+    assert cache.store(unit(1, 0), "有哪些一级分类", value, "v1")
+    # 相似度超过 threshold 但问题不同，不能复用
+    assert cache.lookup(unit(1, 0.3), "有哪些品牌", "v1") is None
+    assert cache.lookup(unit(1, 0.3), "有哪些一级分类 ", "v1") is not None
+    assert cache.lookup(unit(1, 0.01), "一级分类有哪些", "v1") is not None
+
+
+def test_cypher_cache_rejects_entities_without_entity_key():
+    cache = SemanticCypherCache(threshold=0.9, max_size=10, ttl=60)
+    value = {"cypher_query": "MATCH (s:SPU {name: $param_0}) RETURN s", "entities_to_align": [{"param_name": "param_0"}]}
+    assert not cache.store(unit(1, 0), "华为手机", value, "v1")
+    assert cache.lookup(unit(1, 0), "华为手机", "v1") is None
+
+
+def test_labels_of_partly_labeled_pattern_includes_any_label():
+    labels = QueryResultCache.labels_of("MATCH (s:SPU)-[r:Belong]->(c) RETURN c")
+    assert labels == {"SPU", ANY_LABEL}
+
+
+def test_labels_of_ignores_function_calls_and_expressions():
+    cypher = (
+        "MATCH (s:SPU {name: $param_0})-[:Belong]->(c:Category3 WHERE c.id > 0) "
+        "WHERE (s.price > 10) RETURN count(s), toLower(c.name)"
+    )
+    assert QueryResultCache.labels_of(cypher) == {"SPU", "Category3"}
+    assert QueryResultCache.labels_of("MATCH (n:`SPU`:Product) RETURN n") == {"SPU", "Product"}
+    assert QueryResultCache.labels_of("RETURN 1") == {ANY_LABEL}
+
+
+def test_result_cache_invalidates_partly_labeled_query_on_other_label():
+    cache = QueryResultCache(max_bytes=1 << 20, ttl=60)
+    cypher = "MATCH (s:SPU)-[r:Belong]->(c) RETURN c"
+    cache.set(cypher, {}, [{"c": "手机"}])
+    cache.invalidate({"Category3"})
+    assert cache.get(cypher, {}) is None
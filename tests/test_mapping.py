@@ -0,0 +1,54 @@
+from pathlib import Path
+
+import pytest
+
+from datasync.mapping import load_mapping, parse_mapping
+
+MAPPING_FILE = Path(__file__).resolve().parent.parent / "src" / "conf" / "graph_mapping.yaml"
+
+
+@pytest.fixture(scope="module")
+def mapping():
+    return load_mapping(MAPPING_FILE)
+
+
+def relationship(mapping, job):
+    return next(item for item in mapping.relationships if item.job == job)
+
+
+def test_base_attr_category_routes_by_category_level(mapping):
+    base_attr = relationship(mapping, "base_attr_category")
+    assert base_attr.routed
+    assert base_attr.targets() == [("Category1", "BaseAttr"), ("Category2", "BaseAttr"), ("Category3", "BaseAttr")]
+    # MySQL 返回的 category_level 可能是整数也可能是字符串
+    for level in (1, 2, 3, "3"):
+        row = {"start_id": 61, "end_id": 1, "start_route": level}
+        assert base_attr.route(row) == (f"Category{level}", "BaseAttr")
+    assert base_attr.route({"start_id": 61, "end_id": 1, "start_route": 4}) is None
+
+
+def test_routed_relationship_selects_route_column(mapping):
+    sql = relationship(mapping, "base_attr_category").sql()
+    assert "category_id AS start_id" in sql
+    assert "id AS end_id" in sql
+    assert "category_level AS start_route" in sql
+    assert "FROM base_attr_info" in sql
+
+
+def test_job_names_are_unique(mapping):
+    jobs = [item.job for item in mapping.nodes + mapping.relationships]
+    assert len(jobs) == len(set(jobs))
+
+
+def test_parse_mapping_rejects_sql_with_route():
+    spec = {
+        "relationships": [{
+            "job": "bad",
+            "type": "Have",
+            "sql": "SELECT 1",
+            "start": {"route": {"column": "level", "labels": {1: "Category1"}}},
+            "end": {"label": "BaseAttr"},
+        }]
+    }
+    with pytest.raises(ValueError):
+        parse_mapping(spec)
@@ -0,0 +1,79 @@
+import pytest
+
+from datasync.scheduler import SyncJob, SyncScheduler
+
+
+class Recorder:
+    """记录任务执行顺序，fail 中的任务抛出异常"""
+
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+
+    def job(self, name, produces=(), depends=()):
+        def run():
+            self.calls.append(name)
+            if name in self.fail:
+                raise RuntimeError(f"{name} failed")
+
+        return SyncJob(name, run, tuple(produces), tuple(depends))
+
+
+def jobs(recorder):
+    return [
+        recorder.job("node:SPU", produces=["SPU"]),
+        recorder.job("node:Category3", produces=["Category3"]),
+        recorder.job("node:SKU", produces=["SKU"]),
+        recorder.job("rel:SPU-Belong->Category3", depends=["SPU", "Category3"]),
+        recorder.job("rel:SKU-Belong->SPU", depends=["SKU", "SPU"]),
+    ]
+
+
+def test_dependents_run_after_their_dependencies(tmp_path):
+    recorder = Recorder()
+    report = SyncScheduler(jobs(recorder), workers=4, progress_file=tmp_path / "progress.json").run()
+    assert report.ok
+    assert set(recorder.calls) == {job.name for job in jobs(Recorder())}
+    for rel, nodes in (("rel:SPU-Belong->Category3", ("node:SPU", "node:Category3")),
+                       ("rel:SKU-Belong->SPU", ("node:SKU", "node:SPU"))):
+        assert all(recorder.calls.index(node) < recorder.calls.index(rel) for node in nodes)
+    assert not (tmp_path / "progress.json").exists()
+
+
+def test_failed_job_skips_its_dependents_only(tmp_path):
+    recorder = Recorder(fail={"node:Category3"})
+    report = SyncScheduler(jobs(recorder), workers=4, progress_file=tmp_path / "progress.json").run()
+    assert not report.ok
+    assert list(report.failed) == ["node:Category3"]
+    assert report.skipped == ["rel:SPU-Belong->Category3"]
+    assert "rel:SPU-Belong->Category3" not in recorder.calls
+    assert "rel:SKU-Belong->SPU" in recorder.calls
+
+
+def test_resume_skips_completed_jobs(tmp_path):
+    progress_file = tmp_path / "state" / "progress.json"
+    first = Recorder(fail={"node:Category3"})
+    assert not SyncScheduler(jobs(first), workers=2, progress_file=progress_file).run().ok
+    assert progress_file.exists()
+
+    second = Recorder()
+    report = SyncScheduler(jobs(second), workers=2, progress_file=progress_file).run(resume=True)
+    assert report.ok
+    assert report.resumed == ["node:SKU", "node:SPU", "rel:SKU-Belong->SPU"]
+    assert sorted(second.calls) == ["node:Category3", "rel:SPU-Belong->Category3"]
+    assert not progress_file.exists()
+
+
+def test_run_without_resume_starts_over(tmp_path):
+    progress_file = tmp_path / "progress.json"
+    SyncScheduler(jobs(Recorder(fail={"node:SPU"})), workers=2, progress_file=progress_file).run()
+    recorder = Recorder()
+    report = SyncScheduler(jobs(recorder), workers=2, progress_file=progress_file).run()
+    assert report.ok and report.resumed == []
+    assert len(recorder.calls) == 5
+
+
+def test_missing_producer_is_rejected():
+    recorder = Recorder()
+    with pytest.raises(ValueError):
+        SyncScheduler([recorder.job("rel:SKU-Belong->SPU", depends=["SKU", "SPU"])], workers=1)
@@ -0,0 +1,66 @@
+import asyncio
+
+from src.web import startup as startup_module
+from src.web.startup import Startup
+
+
+def run(startup, seconds=0.05):
+    async def main():
+        startup.start()
+        await asyncio.sleep(seconds)
+        await startup.stop()
+
+    asyncio.run(main())
+
+
+def test_optional_component_does_not_block_readiness():
+    calls = []
+
+    async def ok():
+        pass
+
+    async def missing_model():
+        calls.append(1)
+        raise FileNotFoundError("model.safetensors")
+
+    startup = Startup()
+    startup.add("neo4j", ok)
+    startup.add("ner", missing_model, optional=True)
+    run(startup)
+    status = startup.status()
+    assert startup.ready and status["ready"]
+    assert status["components"]["ner"]["status"] == "failed"
+    # 文件缺失重试也无法恢复，只尝试一次
+    assert calls == [1]
+
+
+def test_declared_fatal_errors_are_not_retried(monkeypatch):
+    monkeypatch.setattr(startup_module, "RETRY_INITIAL_DELAY", 0.001)
+    attempts = {"ner": 0, "neo4j": 0}
+
+    async def mismatched_weights():
+        attempts["ner"] += 1
+        raise RuntimeError("size mismatch for classifier.weight")
+
+    async def flaky():
+        attempts["neo4j"] += 1
+        if attempts["neo4j"] < 3:
+            raise RuntimeError("connection refused")
+
+    startup = Startup()
+    startup.add("ner", mismatched_weights, optional=True, fatal=(RuntimeError,))
+    startup.add("neo4j", flaky)
+    run(startup)
+    assert attempts["ner"] == 1
+    assert attempts["neo4j"] == 3
+    assert startup.ready
+
+
+def test_required_component_failure_blocks_readiness():
+    async def broken():
+        raise ImportError("torch")
+
+    startup = Startup()
+    startup.add("embeddings", broken)
+    run(startup)
+    assert not startup.ready
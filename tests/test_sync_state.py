@@ -0,0 +1,77 @@
+from datasync.state import SyncState
+
+NODE_JOB = "node:SPU"
+REL_JOB = "rel:SPU-Belong->Category3"
+OTHER_JOB = "rel:SKU-Belong->SPU"
+
+
+def sync(state, job, rows, key_fields=("id",), confirm=None):
+    """执行一次完整的增量同步，返回 (产出的行, 删除的键)；confirm 为 None 时全部确认"""
+    run = state.begin(job, key_fields)
+    changed = list(run.diff(rows, confirm=confirm is not None))
+    if confirm is not None:
+        run.confirm([row for row in changed if confirm(row)])
+    deleted = run.deleted_keys()
+    run.commit()
+    return changed, deleted
+
+
+def test_diff_yields_new_and_changed_rows_only(tmp_path):
+    state = SyncState(tmp_path / "state.db")
+    rows = [{"id": 1, "name": "华为"}, {"id": 2, "name": "小米"}]
+    changed, deleted = sync(state, NODE_JOB, rows)
+    assert changed == rows and deleted == []
+
+    rows = [{"id": 1, "name": "华为"}, {"id": 2, "name": "红米"}, {"id": 3, "name": "苹果"}]
+    changed, deleted = sync(state, NODE_JOB, rows)
+    assert changed == rows[1:] and deleted == []
+
+    changed, _ = sync(state, NODE_JOB, rows)
+    assert changed == []
+
+
+def test_deleted_keys_reports_vanished_rows(tmp_path):
+    state = SyncState(tmp_path / "state.db")
+    sync(state, NODE_JOB, [{"id": 1, "name": "华为"}, {"id": 2, "name": "小米"}])
+    changed, deleted = sync(state, NODE_JOB, [{"id": 1, "name": "华为"}])
+    assert changed == [] and deleted == [{"id": 2}]
+    # 删除已记入状态，不再重复报告
+    _, deleted = sync(state, NODE_JOB, [{"id": 1, "name": "华为"}])
+    assert deleted == []
+
+
+def test_unconfirmed_relationships_are_retried(tmp_path):
+    state = SyncState(tmp_path / "state.db")
+    key_fields = ("start_id", "end_id")
+    rows = [{"start_id": 1, "end_id": 10}, {"start_id": 2, "end_id": 20}]
+    # 终点 20 还不存在，第二条关系没有写入
+    changed, _ = sync(state, REL_JOB, rows, key_fields, confirm=lambda row: row["end_id"] != 20)
+    assert changed == rows
+
+    changed, deleted = sync(state, REL_JOB, rows, key_fields, confirm=lambda row: True)
+    assert changed == [{"start_id": 2, "end_id": 20}]
+    assert deleted == []
+
+    changed, _ = sync(state, REL_JOB, rows, key_fields, confirm=lambda row: True)
+    assert changed == []
+
+
+def test_forget_endpoints_clears_relationships_of_deleted_nodes(tmp_path):
+    state = SyncState(tmp_path / "state.db")
+    key_fields = ("start_id", "end_id")
+    rel_rows = [{"start_id": 1, "end_id": 10}, {"start_id": 2, "end_id": 20}]
+    other_rows = [{"start_id": 100, "end_id": 1}, {"start_id": 200, "end_id": 2}]
+    sync(state, REL_JOB, rel_rows, key_fields)
+    sync(state, OTHER_JOB, other_rows, key_fields)
+
+    # SPU 1 被 DETACH DELETE 后以相同 id 重新出现，以它为起点或终点的关系都要重新写入
+    state.forget_endpoints("SPU", [1])
+
+    changed, deleted = sync(state, REL_JOB, rel_rows, key_fields)
+    assert changed == [{"start_id": 1, "end_id": 10}] and deleted == []
+    changed, deleted = sync(state, OTHER_JOB, other_rows, key_fields)
+    assert changed == [{"start_id": 100, "end_id": 1}] and deleted == []
+    # 节点任务自身的状态不受影响
+    sync(state, NODE_JOB, [{"id": 1}])
+    state.forget_endpoints("SPU", [1])
+    assert sync(state, NODE_JOB, [{"id": 1}])[0] == []